@@ -1,29 +1,58 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 import redis
+import redis.asyncio as aioredis
+import asyncio
 import uuid
 import json
 import re
 import os
-import time
 from dotenv import load_dotenv
 from google.api_core.exceptions import ResourceExhausted
 from fastapi import Query
 from fastapi.middleware.cors import CORSMiddleware
-
-from rag.rag import answer_question, get_database_info, ensure_database_ready
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from rag.answer_cache import get_answer_cache_stats
+from rag.embeddings import get_embedding_cache_info
+from rag.rag import (
+    answer_question_async,
+    retrieve_batch,
+    generate_answer_async,
+    get_database_info,
+    is_book_available,
+    get_gemini_pool_info,
+)
 from enum import Enum
+from typing import List, Optional
 
 model_index_key_for_query = "query:model_index"
 
 from patient_agent import (
     load_random_patient,
     create_system_prompt,
-    create_memory,
-    initialize_llm,
+    get_llm,
+    get_llm_pool_info,
     create_conversation_chain,
+    astream_response,
     GEMINI_MODELS
 )
+from patient_catalog import get_catalog
+from conversation_memory import history_window, build_memory, update_summary
+from session_store import (
+    create_session,
+    close_session,
+    append_turn,
+    set_session_fields,
+    get_patient,
+    load_chat_state,
+    migrate_all_legacy_sessions,
+)
+from session_lifecycle import run_sweeper, sweep_sessions, get_session_metrics
+from redis_admin import scan_keys_page
+from quota_state import AllModelsExhausted, mark_exhausted, next_available_model
+from warmup import run_warmup, is_ready, warmup_state
 
 # .env yükle
 load_dotenv()
@@ -43,6 +72,17 @@ app.add_middleware(
 # Redis bağlantısı
 REDIS_URL = os.getenv("REDIS_URL")
 r = redis.from_url(REDIS_URL, decode_responses=True)
+# Async endpoint'ler için event loop'u bloklamayan istemci
+ar = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+@app.exception_handler(AllModelsExhausted)
+async def all_models_exhausted_handler(request, exc: AllModelsExhausted):
+    # İsteği bekletmek yerine hemen 503 dön
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # MODELLER
 class MessageInput(BaseModel):
@@ -59,27 +99,35 @@ class DiagnosisInput(BaseModel):
     diagnosis: str
 
 @app.post("/select_area")
-def select_area(area: str, doctor_gender: str = Query(..., regex="^(kadın|erkek)$")):
+async def select_area(
+    area: str,
+    doctor_gender: str = Query(..., regex="^(kadın|erkek)$"),
+    difficulty: Optional[str] = None,
+    student_id: Optional[str] = None,
+    policy: str = Query("uniform", regex="^(uniform|difficulty|no_repeat)$"),
+):
     try:
-        patient = load_random_patient(area)
+        # Zorluk verildiyse ve politika seçilmediyse zorluğa göre seç
+        if difficulty and policy == "uniform":
+            policy = "difficulty"
+        patient = load_random_patient(area, policy=policy, difficulty=difficulty, student_id=student_id)
         system_prompt = create_system_prompt(patient, doctor_gender)
 
         # Yeni session ID oluştur
         session_id = str(uuid.uuid4())
-        memory_key = f"session:{session_id}"
 
         # Varsayılan model
         model_index = 0
         model_name = GEMINI_MODELS[model_index]
-        llm = initialize_llm(model_name)
-        memory = create_memory()
-        conversation = create_conversation_chain(llm, system_prompt, memory)
 
-        # Redis'e başlangıç bilgilerini yaz
-        r.set(f"{memory_key}:prompt", system_prompt)
-        r.set(f"{memory_key}:model_index", model_index)
-        r.set(f"{memory_key}:patient", json.dumps(patient))
-        r.set(f"{memory_key}:doctor_gender", doctor_gender)
+        # Redis'e başlangıç bilgilerini tek hash olarak yaz
+        await create_session(
+            ar, session_id,
+            prompt=system_prompt,
+            model_index=model_index,
+            patient=json.dumps(patient),
+            doctor_gender=doctor_gender,
+        )
 
         return {
             "message": f"{area} alanından hasta yüklendi.",
@@ -87,67 +135,71 @@ def select_area(area: str, doctor_gender: str = Query(..., regex="^(kadın|erkek
             "model": model_name
         }
 
+    except ValueError as e:
+        # Bilinmeyen alan veya istenen zorlukta vaka yok
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/chat")
-def chat(input: MessageInput):
+async def load_chat_turn(input: MessageInput):
+    """Bir sohbet turu için oturum durumunu ve hafızayı Redis'ten yükle"""
     session_id = input.session_id.strip()
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id gerekli.")
 
-    memory_key = f"session:{session_id}"
-    prompt_key = f"{memory_key}:prompt"
-    model_index_key = f"{memory_key}:model_index"
-
     # Mesaj temizle
     cleaned_message = re.sub(r'\s+', ' ', input.message).strip()
     if not cleaned_message:
         raise HTTPException(status_code=400, detail="Mesaj boş olamaz.")
 
-    # Sistem promptu al
-    system_prompt = r.get(prompt_key)
+    # Sistem promptu, model index'i ve geçmiş tek round-trip'te
+    start, end = history_window()
+    state, length, messages = await load_chat_state(
+        ar, session_id, ("prompt", "model_index", "summary", "summary_upto"), start, end
+    )
+    system_prompt = state["prompt"]
     if not system_prompt:
         raise HTTPException(status_code=404, detail="Sistem promptu bulunamadı. Önce /select_area çağrılmalı.")
 
-    # Model index ve model ismi
-    current_index = int(r.get(model_index_key) or 0)
-    model_name = GEMINI_MODELS[current_index]
-    llm = initialize_llm(model_name)
+    current_index = int(state["model_index"] or 0)
 
-    # Hafızayı oluştur
-    messages = r.lrange(memory_key, 0, -1)
-    memory = create_memory()
-    for m in messages:
-        parsed = json.loads(m)
-        memory.chat_memory.add_user_message(parsed["user"])
-        memory.chat_memory.add_ai_message(parsed["bot"])
+    # Hafızayı oluştur (buffer veya özetli mod)
+    memory = build_memory(messages, length, state["summary"], state["summary_upto"])
+
+    return session_id, cleaned_message, system_prompt, current_index, memory
+
+
+@app.post("/chat")
+async def chat(input: MessageInput, background_tasks: BackgroundTasks):
+    session_id, cleaned_message, system_prompt, current_index, memory = await load_chat_turn(input)
 
     last_user_input = cleaned_message
 
     # Predict ve model geçiş işlemi
     while True:
+        # Soğumadaki modelleri atla; hiç model yoksa AllModelsExhausted -> 503
+        next_index, model_name = await next_available_model(ar, GEMINI_MODELS, current_index)
+        if next_index != current_index:
+            current_index = next_index
+            await set_session_fields(ar, session_id, model_index=current_index)
+        llm = get_llm(model_name)
         try:
             conversation = create_conversation_chain(llm, system_prompt, memory)
-            response = conversation.predict(input=last_user_input)
+            response = await conversation.apredict(input=last_user_input)
 
             # Hafızaya ekle
-            r.rpush(memory_key, json.dumps({"user": last_user_input, "bot": response}))
+            await append_turn(ar, session_id, last_user_input, response)
             break
         except ResourceExhausted:
-            current_index += 1
-            if current_index >= len(GEMINI_MODELS):
-                print("Tüm modellerin kotası doldu. 10 dakika bekleniyor...")
-                time.sleep(600)
-                current_index = 0
-
-            model_name = GEMINI_MODELS[current_index]
-            r.set(model_index_key, current_index)
-            llm = initialize_llm(model_name)
+            await mark_exhausted(ar, model_name)
+            current_index = (current_index + 1) % len(GEMINI_MODELS)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Beklenmeyen model hatası: {str(e)}")
 
+    # Eski turları cevap döndükten sonra özete kat
+    background_tasks.add_task(update_summary, ar, session_id)
+
     return {
         "session_id": session_id,
         "model": model_name,
@@ -155,78 +207,178 @@ def chat(input: MessageInput):
     }
 
 
+@app.post("/chat/stream")
+async def chat_stream(input: MessageInput):
+    """Hasta cevabını Server-Sent Events ile token token gönder"""
+    session_id, cleaned_message, system_prompt, current_index, memory = await load_chat_turn(input)
+
+    # Hiç model yoksa stream başlamadan 503 dön
+    current_index, _ = await next_available_model(ar, GEMINI_MODELS, current_index)
+
+    def sse(data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def event_stream():
+        index = current_index
+        tokens = []
+        while True:
+            try:
+                next_index, model_name = await next_available_model(ar, GEMINI_MODELS, index)
+            except AllModelsExhausted as e:
+                yield sse({"detail": str(e), "retry_after": e.retry_after}, event="error")
+                return
+            if next_index != index:
+                index = next_index
+                await set_session_fields(ar, session_id, model_index=index)
+            llm = get_llm(model_name)
+            try:
+                async for token in astream_response(llm, system_prompt, memory, cleaned_message):
+                    if not tokens:
+                        yield sse({"session_id": session_id, "model": model_name}, event="start")
+                    tokens.append(token)
+                    yield sse({"token": token})
+                break
+            except ResourceExhausted:
+                # İlk token gönderildikten sonra model değiştirilemez
+                if tokens:
+                    yield sse({"detail": "Model kotası yanıt sırasında doldu."}, event="error")
+                    return
+                await mark_exhausted(ar, model_name)
+                index = (index + 1) % len(GEMINI_MODELS)
+            except Exception as e:
+                yield sse({"detail": f"Beklenmeyen model hatası: {str(e)}"}, event="error")
+                return
+
+        # Tur tamamlandıktan sonra hafızaya yaz
+        response = "".join(tokens)
+        await append_turn(ar, session_id, cleaned_message, response)
+        yield sse({"session_id": session_id, "model": model_name, "response": response}, event="end")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(update_summary, ar, session_id),
+    )
+
+
 @app.post("/reset")
-def reset_session(session_id: str):
-    memory_key = f"session:{session_id}"
-    r.delete(memory_key)
-    r.delete(f"{memory_key}:prompt")
-    r.delete(f"{memory_key}:model_index")
+async def reset_session(session_id: str):
+    # Oturuma ait tüm anahtarları sil
+    await close_session(ar, session_id)
     return {"message": f"{session_id} oturumu sıfırlandı."}
 
 
 @app.get("/status")
+@app.get("/status/live")
 def health_check():
+    """Liveness: süreç ayakta ve istek karşılıyor (ısınmayı beklemez)"""
     return {"status": "OK"}
 
 
+@app.get("/status/ready")
+def readiness_check():
+    """Readiness: Chroma, embedding modeli ve LLM istemcileri ısındıysa 200, yoksa 503"""
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": warmup_state["status"], "warmup": warmup_state})
+    return {"status": "ready", "warmup": warmup_state}
+
+
+@app.get("/stats/sessions")
+async def session_stats():
+    """Aktif oturum sayısı ve oturum başına Redis bellek kullanımı"""
+    return await get_session_metrics(ar)
+
+
+@app.post("/sessions/sweep")
+async def sweep_sessions_now():
+    try:
+        return await sweep_sessions(ar)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/stats/answer_cache")
+def answer_cache_stats():
+    try:
+        return get_answer_cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/stats/embedding_cache")
+def embedding_cache_stats():
+    return get_embedding_cache_info()
+
+
+@app.get("/stats/llm_pool")
+def llm_pool_stats():
+    return {
+        "patient_agent": get_llm_pool_info(),
+        "rag": get_gemini_pool_info(),
+    }
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    sweeper = getattr(app.state, "session_sweeper", None)
+    if sweeper:
+        sweeper.cancel()
+    await ar.aclose()
+
+
 @app.get("/lab/vital_signs")
-def get_vital_signs(session_id: str):
-    patient_json = r.get(f"session:{session_id}:patient")
-    if not patient_json:
+async def get_vital_signs(session_id: str):
+    patient_data = await get_patient(ar, session_id)
+    if not patient_data:
         raise HTTPException(status_code=404, detail="Hasta verisi bulunamadı.")
-    patient_data = json.loads(patient_json)
     vital_signs = patient_data.get("patient_profile", {}).get("vital_signs", {})
     return {"vital_signs": vital_signs}
 
 
 @app.get("/lab/physical_exam")
-def get_physical_exam(session_id: str):
-    patient_json = r.get(f"session:{session_id}:patient")
-    if not patient_json:
+async def get_physical_exam(session_id: str):
+    patient_data = await get_patient(ar, session_id)
+    if not patient_data:
         raise HTTPException(status_code=404, detail="Hasta verisi bulunamadı.")
-    patient_data = json.loads(patient_json)
     physical_exam = patient_data.get("patient_profile", {}).get("physical_exam", {})
     return {"physical_exam": physical_exam}
 
 
 @app.get("/lab/laboratory")
-def get_laboratory(session_id: str):
-    patient_json = r.get(f"session:{session_id}:patient")
-    if not patient_json:
+async def get_laboratory(session_id: str):
+    patient_data = await get_patient(ar, session_id)
+    if not patient_data:
         raise HTTPException(status_code=404, detail="Hasta verisi bulunamadı.")
-    patient_data = json.loads(patient_json)
     laboratory = patient_data.get("patient_profile", {}).get("laboratory", {})
     return {"laboratory": laboratory}
 
 
 @app.get("/lab/imaging")
-def get_imaging(session_id: str):
-    patient_json = r.get(f"session:{session_id}:patient")
-    if not patient_json:
+async def get_imaging(session_id: str):
+    patient_data = await get_patient(ar, session_id)
+    if not patient_data:
         raise HTTPException(status_code=404, detail="Hasta verisi bulunamadı.")
-    patient_data = json.loads(patient_json)
     imaging = patient_data.get("patient_profile", {}).get("imaging", {})
     return {"imaging": imaging}
 
 @app.post("/diagnose")
-def submit_diagnosis(data: DiagnosisInput):
+async def submit_diagnosis(data: DiagnosisInput):
     session_id = data.session_id.strip()
     diagnosis = data.diagnosis.strip()
 
     if not session_id or not diagnosis:
         raise HTTPException(status_code=400, detail="session_id ve diagnosis gereklidir.")
 
-    patient_key = f"session:{session_id}:patient"
-    patient_json = r.get(patient_key)
+    patient_data = await get_patient(ar, session_id)
 
-    if not patient_json:
+    if not patient_data:
         raise HTTPException(status_code=404, detail="Hasta verisi bulunamadı.")
 
-    patient_data = json.loads(patient_json)
     correct_diagnosis = patient_data.get("correct_diagnosis", "")
 
-    key = f"session:{session_id}:diagnosis"
-    r.set(key, diagnosis)
+    await set_session_fields(ar, session_id, diagnosis=diagnosis)
 
     correct_diagnosis_main = re.split(r"\s*\(", correct_diagnosis)[0].strip().lower()
     diagnosis_main = diagnosis.strip().lower()
@@ -250,14 +402,12 @@ def submit_diagnosis(data: DiagnosisInput):
     }
 
 @app.get("/patient_info")
-def get_patient_info(session_id: str):
-    patient_key = f"session:{session_id}:patient"
-    patient_json = r.get(patient_key)
+async def get_patient_info(session_id: str):
+    patient_data = await get_patient(ar, session_id)
 
-    if not patient_json:
+    if not patient_data:
         raise HTTPException(status_code=404, detail="Hasta verisi bulunamadı.")
 
-    patient_data = json.loads(patient_json)
     name = patient_data.get("patient_profile", {}).get("name", "Bilinmiyor")
     age = patient_data.get("patient_profile", {}).get("age", "Bilinmiyor")
     age_unit = patient_data.get("patient_profile", {}).get("age_unit", "yaş")
@@ -275,8 +425,13 @@ def get_patient_info(session_id: str):
 
 @app.on_event("startup")
 async def startup_event():
-    """Uygulama başlarken database'in hazır olduğundan emin ol"""
-    ensure_database_ready()
+    """Uygulama başlarken kataloğu yükle ve sıcak yolu arka planda hazırla"""
+    # Vaka kataloğunu bir kez belleğe yükle
+    get_catalog()
+    # Süresi dolmamış ama sahipsiz kalmış oturum anahtarlarını temizleyen süpürücü
+    app.state.session_sweeper = asyncio.create_task(run_sweeper(ar))
+    # Chroma, embedding modeli ve LLM istemcileri arka planda ısıtılır; hazır olunca /status/ready 200 döner
+    app.state.warmup = asyncio.create_task(run_warmup())
 
 
 
@@ -294,33 +449,53 @@ class MedicalSpecialty(str, Enum):
     PEDIATRICS = "pediatri"
     RHEUMATOLOGY = "romatoloji"
 
+SPECIALTY_MAP = {
+    MedicalSpecialty.ENDOCRINOLOGY: "endocrinology",
+    MedicalSpecialty.CARDIOLOGY: "cardiology",
+    MedicalSpecialty.DERMATOLOGY: "dermatology",
+    MedicalSpecialty.NEUROLOGY: "neurology",
+    MedicalSpecialty.GASTROENTEROLOGY: "gastroenterology",
+    MedicalSpecialty.PULMONOLOGY: "pulmonology",
+    MedicalSpecialty.NEPHROLOGY: "nephrology",
+    MedicalSpecialty.INFECTIOUS_DISEASES: "infectious_diseases",
+    MedicalSpecialty.PEDIATRICS: "pediatrics",
+    MedicalSpecialty.RHEUMATOLOGY: "rheumatology"
+}
+
+def map_specialty(specialty: MedicalSpecialty) -> str:
+    return SPECIALTY_MAP.get(specialty, specialty.value.lower())
+
+def source_details(rag_result) -> dict:
+    if isinstance(rag_result, dict) and rag_result.get("source_metadata"):
+        metadata = rag_result["source_metadata"]
+        return {
+            "book_title": metadata.get("book_title", "Unknown"),
+            "page_number": metadata.get("page_number", "Unknown"),
+            "specialty": metadata.get("specialty", "Unknown")
+        }
+    return {}
+
 class SpecialtyQueryRequest(BaseModel):
     question: str
     specialty: MedicalSpecialty
 
+# Toplu sorguda aynı anda Gemini'ye giden en fazla istek sayısı
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", "4"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "100"))
+
+class BatchQueryRequest(BaseModel):
+    questions: List[SpecialtyQueryRequest]
+
 @app.post("/query")
 async def query_by_specialty(request: SpecialtyQueryRequest):
     """Seçilen uzmanlık alanına göre medical soru sorma"""
     try:
-        specialty_map = {
-            MedicalSpecialty.ENDOCRINOLOGY: "endocrinology",
-            MedicalSpecialty.CARDIOLOGY: "cardiology",
-            MedicalSpecialty.DERMATOLOGY: "dermatology",
-            MedicalSpecialty.NEUROLOGY: "neurology",
-            MedicalSpecialty.GASTROENTEROLOGY: "gastroenterology",
-            MedicalSpecialty.PULMONOLOGY: "pulmonology",
-            MedicalSpecialty.NEPHROLOGY: "nephrology",
-            MedicalSpecialty.INFECTIOUS_DISEASES: "infectious_diseases",
-            MedicalSpecialty.PEDIATRICS: "pediatrics",
-            MedicalSpecialty.RHEUMATOLOGY: "rheumatology"
-        }
-
-        mapped_specialty = specialty_map.get(request.specialty, request.specialty.value.lower())
-
-        db_info = get_database_info()
-        available_books = db_info.get("available_books", [])
+        mapped_specialty = map_specialty(request.specialty)
 
-        if mapped_specialty not in available_books:
+        # Chroma/Redis çağrıları senkron; event loop'u bloklamamak için thread'de
+        if not await asyncio.to_thread(is_book_available, mapped_specialty):
+            db_info = await asyncio.to_thread(get_database_info)
+            available_books = db_info.get("available_books", [])
             return {
                 "question": request.question,
                 "specialty": request.specialty,
@@ -332,34 +507,22 @@ async def query_by_specialty(request: SpecialtyQueryRequest):
 
 
         # Redis'ten mevcut model index'i al (yoksa 0)
-        current_index = int(r.get(model_index_key_for_query) or 0)
-
-        # Model listesi (GEMINI_MODELS global değişken olmalı)
-        max_index = len(GEMINI_MODELS) - 1
+        current_index = int(await ar.get(model_index_key_for_query) or 0)
 
         while True:
+            # Soğumadaki modelleri atla; hiç model yoksa AllModelsExhausted -> 503
+            current_index, model_name = await next_available_model(ar, GEMINI_MODELS, current_index)
             try:
-                # Kullanılacak model adı
-                model_name = GEMINI_MODELS[current_index]
-
-                rag_result = answer_question(request.question, specialty=mapped_specialty, model=model_name)
+                rag_result = await answer_question_async(request.question, specialty=mapped_specialty, model=model_name)
                 # Başarılıysa sonucu dön
                 if isinstance(rag_result, dict):
                     answer_text = rag_result.get("answer", str(rag_result))
-                    source_info = {}
-                    if rag_result.get("source_metadata"):
-                        metadata = rag_result["source_metadata"]
-                        source_info = {
-                            "book_title": metadata.get("book_title", "Unknown"),
-                            "page_number": metadata.get("page_number", "Unknown"),
-                            "specialty": metadata.get("specialty", "Unknown")
-                        }
                 else:
                     answer_text = str(rag_result)
-                    source_info = {}
+                source_info = source_details(rag_result)
 
                 # Kullanılan modeli ve index'i redis'e yaz
-                r.set(model_index_key_for_query, current_index)
+                await ar.set(model_index_key_for_query, current_index)
 
                 return {
                     "question": request.question,
@@ -368,41 +531,129 @@ async def query_by_specialty(request: SpecialtyQueryRequest):
                     "answer": answer_text,
                     "status": "success",
                     "source_details": source_info,
+                    "sources": rag_result.get("sources", []) if isinstance(rag_result, dict) else [],
                     "model": model_name,
                     "query_info": rag_result.get("query_info") if isinstance(rag_result, dict) else None
                 }
 
             except ResourceExhausted:
-                # Kota dolduğunda indeksi artır
-                current_index += 1
-                if current_index > max_index:
-                    # Tüm modeller dolduysa biraz bekle ve başa dön
-                    print("Tüm modellerin kotası doldu. 10 dakika bekleniyor...")
-                    time.sleep(600)
-                    current_index = 0
-                # Redis'te güncelle
-                r.set(model_index_key_for_query, current_index)
+                # Kota dolduğunda modeli soğumaya al ve sıradakine geç
+                await mark_exhausted(ar, model_name)
+                current_index = (current_index + 1) % len(GEMINI_MODELS)
+                await ar.set(model_index_key_for_query, current_index)
 
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
+    except (HTTPException, AllModelsExhausted):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
 
 
-@app.get("/redis/keys")
-def list_redis_keys():
-    try:
-        keys = r.keys("*")
-        result = {}
-        for key in keys:
+async def generate_with_failover(question: str, specialty: str, db_results: dict):
+    """Tek bir toplu sorgu öğesini kota failover'ı ile cevapla; (model, sonuç) döndür"""
+    current_index = int(await ar.get(model_index_key_for_query) or 0)
+    while True:
+        current_index, model_name = await next_available_model(ar, GEMINI_MODELS, current_index)
+        try:
+            result = await generate_answer_async(question, specialty, model_name, db_results)
+            await ar.set(model_index_key_for_query, current_index)
+            return model_name, result
+        except ResourceExhausted:
+            await mark_exhausted(ar, model_name)
+            current_index = (current_index + 1) % len(GEMINI_MODELS)
+            await ar.set(model_index_key_for_query, current_index)
+
+
+@app.post("/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """Birden çok soruyu specialty başına tek Chroma sorgusu ve eşzamanlı üretimle cevapla"""
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Soru listesi boş")
+    if len(request.questions) > QUERY_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"En fazla {QUERY_BATCH_MAX_SIZE} soru gönderilebilir")
+
+    results = [None] * len(request.questions)
+    groups = {}
+    for i, item in enumerate(request.questions):
+        mapped_specialty = map_specialty(item.specialty)
+        base = {"index": i, "question": item.question, "specialty": item.specialty, "mapped_specialty": mapped_specialty}
+        if not await asyncio.to_thread(is_book_available, mapped_specialty):
+            results[i] = {**base, "status": "book_not_available",
+                          "answer": f"📚 {item.specialty.title()} kitabı henüz yüklenmemiş."}
+            continue
+        groups.setdefault(mapped_specialty, []).append(base)
+
+    # Önbellek kontrolü ve retrieval: specialty başına tek Chroma çağrısı
+    current_index = int(await ar.get(model_index_key_for_query) or 0)
+    _, cache_model = await next_available_model(ar, GEMINI_MODELS, current_index)
+    pending = []
+    for mapped_specialty, group in groups.items():
+        try:
+            retrieved = await asyncio.to_thread(
+                retrieve_batch, [base["question"] for base in group], mapped_specialty, cache_model
+            )
+        except Exception as e:
+            for base in group:
+                results[base["index"]] = {**base, "status": "error", "detail": f"Retrieval error: {e}"}
+            continue
+        for base, item in zip(group, retrieved):
+            if item["cached"]:
+                results[base["index"]] = {**base, "status": "success", "answer": item["cached"].get("answer"),
+                                          "source_details": source_details(item["cached"]),
+                                          "sources": item["cached"].get("sources", []), "model": cache_model,
+                                          "query_info": item["cached"].get("query_info")}
+            else:
+                pending.append((base, item))
+
+    semaphore = asyncio.Semaphore(QUERY_BATCH_CONCURRENCY)
+
+    async def run(base, item):
+        async with semaphore:
             try:
-                val = r.get(key)
-                result[key] = val
+                model_name, rag_result = await generate_with_failover(item["question"], item["specialty"], item["db_results"])
+            except AllModelsExhausted as e:
+                results[base["index"]] = {**base, "status": "quota_exhausted", "retry_after": e.retry_after}
+                return
             except Exception as e:
-                result[key] = f"Hata: {str(e)}"
-        return {"redis_keys": result}
+                results[base["index"]] = {**base, "status": "error", "detail": f"Query error: {e}"}
+                return
+            results[base["index"]] = {**base, "status": "success", "answer": rag_result.get("answer"),
+                                      "source_details": source_details(rag_result),
+                                      "sources": rag_result.get("sources", []), "model": model_name,
+                                      "query_info": rag_result.get("query_info")}
+
+    await asyncio.gather(*(run(base, item) for base, item in pending))
+
+    return {
+        "count": len(results),
+        "succeeded": sum(1 for result in results if result["status"] == "success"),
+        "results": results,
+    }
+
+
+@app.get("/redis/keys")
+async def list_redis_keys(
+    cursor: int = Query(0, ge=0),
+    count: int = Query(100, ge=1, le=1000),
+    match: str = "*",
+    preview: int = Query(200, ge=0, le=10000),
+):
+    """Anahtarları SCAN ile sayfa sayfa listele; sonraki sayfa için dönen cursor'ı gönder"""
+    try:
+        return await scan_keys_page(ar, cursor=cursor, count=count, match=match, preview=preview)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/redis/migrate_sessions")
+async def migrate_sessions():
+    """Eski formattaki (ayrı string anahtarlı) oturumları hash formatına taşı"""
+    try:
+        migrated = await migrate_all_legacy_sessions(ar)
+        return {"message": f"{migrated} oturum hash formatına taşındı.", "migrated": migrated}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
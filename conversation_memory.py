@@ -0,0 +1,111 @@
+"""
+Sohbet hafızası
+"buffer" modunda tüm görüşme geçmişi modele gönderilir (eski davranış).
+"summary" modunda yalnızca özete henüz katlanmamış turlar (en az son N tur)
+aynen gönderilir; daha eski turlar Redis'te oturumla birlikte saklanan ve
+artımlı güncellenen bir özete katlanır.
+Böylece uzun anamnez görüşmelerinde tur başına gecikme ve token sabit kalır.
+"""
+
+import json
+import os
+
+from langchain.schema import SystemMessage
+
+from patient_agent import create_memory, get_llm, GEMINI_MODELS
+from rag.context import estimate_tokens
+from session_store import history_key, state_key, summary_lock_key, set_session_fields
+
+MEMORY_MODE = os.getenv("CHAT_MEMORY_MODE", "buffer")
+MAX_VERBATIM_TURNS = int(os.getenv("CHAT_MEMORY_MAX_TURNS", "8"))
+TOKEN_BUDGET = int(os.getenv("CHAT_MEMORY_TOKEN_BUDGET", "2000"))
+# Özet her seferinde en az bu kadar yeni tur biriktiğinde güncellenir
+SUMMARY_BATCH_TURNS = int(os.getenv("CHAT_SUMMARY_BATCH_TURNS", str(max(1, MAX_VERBATIM_TURNS // 2))))
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", GEMINI_MODELS[0])
+
+
+def history_window():
+    """Sohbet geçmişinden okunacak (başlangıç, bitiş) aralığı"""
+    if MEMORY_MODE != "summary":
+        return 0, -1
+    # Özetlenmeyi bekleyen turlar kaybolmasın diye pencere bir batch kadar geniş tutulur
+    return -(MAX_VERBATIM_TURNS + SUMMARY_BATCH_TURNS), -1
+
+
+def _build_memory(turns, summary=None):
+    memory = create_memory()
+    if summary:
+        memory.chat_memory.add_message(SystemMessage(content=f"Görüşmenin önceki kısmının özeti: {summary}"))
+    for turn in turns:
+        memory.chat_memory.add_user_message(turn["user"])
+        memory.chat_memory.add_ai_message(turn["bot"])
+    return memory
+
+
+def build_memory(messages, length, summary=None, summary_upto=None):
+    """history_window() ile okunan geçmişten seçili moda göre hafıza oluştur"""
+    if MEMORY_MODE != "summary":
+        return _build_memory(json.loads(m) for m in messages)
+
+    upto = int(summary_upto or 0)
+    first_index = length - len(messages)
+    turns = [json.loads(m) for i, m in enumerate(messages) if first_index + i >= upto]
+
+    # Özete katlanmamış turların hepsi aynen gönderilir (özet bir batch biriktiğinde
+    # güncellendiği için bu sayı MAX_VERBATIM_TURNS'ü geçebilir); yalnızca token
+    # bütçesi kırpar. En yeni turlardan geriye doğru bütçeye sığanları al
+    budget = TOKEN_BUDGET - (estimate_tokens(summary) if summary else 0)
+    kept = []
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn["user"]) + estimate_tokens(turn["bot"])
+        if kept and budget - cost < 0:
+            break
+        kept.append(turn)
+        budget -= cost
+    kept.reverse()
+
+    return _build_memory(kept, summary)
+
+
+async def update_summary(client, session_id: str):
+    """Son N turdan eski ve henüz özetlenmemiş turları özete ekle"""
+    if MEMORY_MODE != "summary":
+        return
+
+    memory_key = history_key(session_id)
+    lock_key = summary_lock_key(session_id)
+
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hmget(state_key(session_id), ("summary", "summary_upto"))
+        pipe.llen(memory_key)
+        (summary, upto), length = await pipe.execute()
+
+    upto = int(upto or 0)
+    target = length - MAX_VERBATIM_TURNS
+    if target - upto < SUMMARY_BATCH_TURNS:
+        return
+
+    # Aynı oturum için eşzamanlı özetlemeyi engelle
+    if not await client.set(lock_key, 1, nx=True, ex=120):
+        return
+    try:
+        messages = await client.lrange(memory_key, upto, target - 1)
+        transcript = "\n".join(
+            f"Doktor: {t['user']}\nHasta: {t['bot']}" for t in (json.loads(m) for m in messages)
+        )
+        prompt = (
+            "Bir tıp öğrencisi ile simüle hasta arasındaki görüşmeyi özetliyorsun.\n"
+            "Mevcut özeti yeni konuşmalarla güncelle. Hastanın verdiği bilgileri, "
+            "sorulan soruları ve önemli ayrıntıları kısa ve eksiksiz tut.\n\n"
+            f"Mevcut özet: {summary or 'Yok'}\n\n"
+            f"Yeni konuşmalar:\n{transcript}\n\n"
+            "Güncellenmiş özet:"
+        )
+        result = await get_llm(SUMMARY_MODEL, temperature=0).ainvoke(prompt)
+
+        await set_session_fields(client, session_id, summary=result.content.strip(), summary_upto=target)
+    except Exception as e:
+        # Özetleme başarısızsa turlar pencerede kalır, bir sonraki turda tekrar denenir
+        print(f"⚠️ Özet güncellenemedi ({session_id}): {e}")
+    finally:
+        await client.delete(lock_key)
@@ -1,43 +1,23 @@
-import random
-import json
 import os
-import time
+import threading
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import ConversationChain
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.schema import SystemMessage
-from google.api_core.exceptions import ResourceExhausted
 from langchain.memory import ConversationBufferMemory
 import google.generativeai as genai
 
+from patient_catalog import get_catalog, PATIENT_DATA_DIR
+
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
 # random hasta seçimi
-def load_random_patient(area: str, base_path="./patient_data"):
-    path = os.path.join(base_path, area)
-    print(f"Yüklenmek istenen klasör: {path}")
-
-    if not os.path.exists(path):
-        raise Exception(f"Klasör bulunamadı: {path}")
-
-    files = [f for f in os.listdir(path) if f.endswith(".json")]
-    if not files:
-        raise Exception(f"{path} klasöründe json dosyası yok.")
-
-    chosen = random.choice(files)
-    print(f"Seçilen hasta dosyası: {area}/{chosen}")
-
-    with open(os.path.join(path, chosen), 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    cases = data.get("disease_info", {}).get("cases", [])
-    if not cases:
-        raise Exception("Seçilen dosyada hiç vaka bulunamadı.")
-
-    # Tek vaka varsa direkt onu al
-    return cases[0]
+def load_random_patient(area: str, base_path=PATIENT_DATA_DIR, policy="uniform", **options):
+    """Bellekteki vaka kataloğundan hasta seç (disk okuması yapmaz)"""
+    catalog = get_catalog(base_path)
+    return catalog.select(area, policy=policy, **options)
 
 
 
@@ -130,13 +110,49 @@ def initialize_llm(model_name="models/gemini-1.5-pro-latest", temperature=0.7):
     )
 
 
+# Süreç boyunca paylaşılan LLM istemcileri: (model, temperature) -> istemci
+_llm_pool = {}
+_llm_pool_lock = threading.Lock()
+llm_pool_stats = {"hits": 0, "misses": 0}
+
+
+def get_llm(model_name="models/gemini-1.5-pro-latest", temperature=0.7):
+    """Model için havuzdaki istemciyi döndür, yoksa bir kez oluştur"""
+    key = (model_name, temperature)
+    llm = _llm_pool.get(key)
+    if llm is not None:
+        llm_pool_stats["hits"] += 1
+        return llm
+    with _llm_pool_lock:
+        llm = _llm_pool.get(key)
+        if llm is None:
+            llm_pool_stats["misses"] += 1
+            llm = initialize_llm(model_name, temperature)
+            _llm_pool[key] = llm
+        else:
+            llm_pool_stats["hits"] += 1
+    return llm
+
+
+def get_llm_pool_info():
+    return {
+        "clients": len(_llm_pool),
+        "models": sorted({model for model, _ in _llm_pool}),
+        **llm_pool_stats,
+    }
+
+
 # Chat modeli ve memory ayarlama
-def create_conversation_chain(llm_instance, system_prompt, memory):
-    prompt = ChatPromptTemplate.from_messages([
+def create_chat_prompt(system_prompt):
+    return ChatPromptTemplate.from_messages([
         SystemMessage(content=system_prompt),
         MessagesPlaceholder(variable_name="history"),
         ("human", "{input}")
     ])
+
+
+def create_conversation_chain(llm_instance, system_prompt, memory):
+    prompt = create_chat_prompt(system_prompt)
     chain = ConversationChain(
         llm=llm_instance,
         prompt=prompt,
@@ -145,6 +161,14 @@ def create_conversation_chain(llm_instance, system_prompt, memory):
     )
     return chain
 
+# Hasta cevabını token token üret (streaming)
+async def astream_response(llm_instance, system_prompt, memory, user_input):
+    chain = create_chat_prompt(system_prompt) | llm_instance
+    history = memory.load_memory_variables({})["history"]
+    async for chunk in chain.astream({"history": history, "input": user_input}):
+        if chunk.content:
+            yield chunk.content
+
 def list_supported_models():
     try:
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -0,0 +1,171 @@
+"""
+Hasta vaka kataloğu
+patient_data/ altındaki tüm vakaları uygulama başlarken bir kez belleğe yükler
+ve uzmanlık alanı, hastalık, zorluk ve case_id'ye göre indeksler.
+Oturum açılırken disk okuması veya JSON parse işlemi yapılmaz.
+"""
+
+import json
+import os
+import random
+import threading
+from collections import OrderedDict, defaultdict
+
+PATIENT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patient_data")
+# no_repeat için tutulan en fazla (öğrenci, alan) destesi; en eski kullanılan atılır
+MAX_DECKS = int(os.getenv("PATIENT_MAX_DECKS", "10000"))
+
+# Seçim politikaları: isim -> fonksiyon(catalog, area, **options)
+SELECTION_POLICIES = {}
+
+
+def register_policy(name):
+    """Yeni bir vaka seçim politikası kaydet"""
+    def decorator(func):
+        SELECTION_POLICIES[name] = func
+        return func
+    return decorator
+
+
+class PatientCatalog:
+    """Belleğe yüklenmiş vaka kataloğu"""
+
+    def __init__(self):
+        self.entries = []
+        self.by_case_id = {}
+        self.by_specialty = defaultdict(list)
+        self.by_disease = defaultdict(list)
+        self.by_difficulty = defaultdict(list)
+        self.by_specialty_difficulty = defaultdict(list)
+        # no_repeat politikası için öğrenci başına karıştırılmış vaka destesi.
+        # Desteler süreç içindedir; worker'lar arasında paylaşılmaz
+        self._decks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, specialty, disease_info, case):
+        entry = {
+            "case_id": case.get("case_id") or f"{specialty}_{len(self.entries)}",
+            "specialty": specialty,
+            "disease_id": disease_info.get("id", ""),
+            "difficulty": str(disease_info.get("difficulty", "")).lower(),
+            "case": case,
+        }
+        self.entries.append(entry)
+        self.by_case_id[entry["case_id"]] = entry
+        self.by_specialty[specialty].append(entry)
+        self.by_disease[entry["disease_id"]].append(entry)
+        self.by_difficulty[entry["difficulty"]].append(entry)
+        self.by_specialty_difficulty[(specialty, entry["difficulty"])].append(entry)
+
+    def specialties(self):
+        return list(self.by_specialty.keys())
+
+    def get_case(self, case_id):
+        entry = self.by_case_id.get(case_id)
+        if entry is None:
+            raise ValueError(f"Vaka bulunamadı: {case_id}")
+        return entry["case"]
+
+    def select(self, area, policy="uniform", **options):
+        """Seçilen politikaya göre bir vaka döndür"""
+        if area not in self.by_specialty:
+            raise ValueError(f"Bu alan için vaka bulunamadı: {area}")
+        selector = SELECTION_POLICIES.get(policy)
+        if selector is None:
+            raise ValueError(f"Bilinmeyen seçim politikası: {policy}")
+        return selector(self, area, **options)["case"]
+
+    def stats(self):
+        return {
+            "total_cases": len(self.entries),
+            "specialties": {s: len(e) for s, e in self.by_specialty.items()},
+            "difficulties": {d: len(e) for d, e in self.by_difficulty.items()},
+        }
+
+
+@register_policy("uniform")
+def _select_uniform(catalog, area, **options):
+    return random.choice(catalog.by_specialty[area])
+
+
+@register_policy("difficulty")
+def _select_by_difficulty(catalog, area, difficulty=None, **options):
+    if not difficulty:
+        return _select_uniform(catalog, area)
+    entries = catalog.by_specialty_difficulty.get((area, difficulty.lower()))
+    if not entries:
+        raise ValueError(f"{area} alanında '{difficulty}' zorlukta vaka yok.")
+    return random.choice(entries)
+
+
+@register_policy("no_repeat")
+def _select_no_repeat(catalog, area, student_id=None, **options):
+    """Öğrenci alandaki tüm vakaları görene kadar aynı vakayı tekrar vermez
+    (yalnızca aynı worker süreci içinde garanti edilir)"""
+    if not student_id:
+        return _select_uniform(catalog, area)
+    key = (student_id, area)
+    with catalog._lock:
+        deck = catalog._decks.get(key)
+        if not deck:
+            deck = list(catalog.by_specialty[area])
+            random.shuffle(deck)
+            catalog._decks[key] = deck
+        catalog._decks.move_to_end(key)
+        while len(catalog._decks) > MAX_DECKS:
+            catalog._decks.popitem(last=False)
+        return deck.pop()
+
+
+def build_catalog(base_path=PATIENT_DATA_DIR):
+    """metadata.json ve uzmanlık klasörlerinden kataloğu oluştur"""
+    catalog = PatientCatalog()
+
+    folders = []
+    metadata_path = os.path.join(base_path, "metadata.json")
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        for specialty in metadata.get("medical_specialties_database", {}).get("specialties", []):
+            folder = specialty.get("folder") or specialty.get("id")
+            if folder and folder not in folders:
+                folders.append(folder)
+
+    # metadata'da olmayan klasörleri de dahil et
+    for name in sorted(os.listdir(base_path)):
+        if os.path.isdir(os.path.join(base_path, name)) and name not in folders and not name.startswith("__"):
+            folders.append(name)
+
+    for folder in folders:
+        path = os.path.join(base_path, folder)
+        if not os.path.isdir(path):
+            print(f"⚠️ Klasör bulunamadı: {path}")
+            continue
+        for file_name in sorted(os.listdir(path)):
+            if not file_name.endswith(".json"):
+                continue
+            with open(os.path.join(path, file_name), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            disease_info = data.get("disease_info", {})
+            for case in disease_info.get("cases", []):
+                catalog.add(folder, disease_info, case)
+
+    print(f"✅ Vaka kataloğu yüklendi: {len(catalog.entries)} vaka, {len(catalog.by_specialty)} alan")
+    return catalog
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(base_path=PATIENT_DATA_DIR):
+    """Kataloğu ilk çağrıda oluştur, sonra bellekten döndür"""
+    key = os.path.abspath(base_path)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                catalog = build_catalog(key)
+                _catalogs[key] = catalog
+    return catalog
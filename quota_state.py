@@ -0,0 +1,55 @@
+"""
+Gemini model kota durumu
+Kotası dolan her model için Redis'te bir "cooldown bitiş zamanı" tutulur.
+Tüm worker'lar aynı durumu paylaşır; soğumakta olan modeller beklemeden atlanır.
+"""
+
+import math
+import os
+import time
+
+QUOTA_KEY_PREFIX = "quota:cooldown:"
+DEFAULT_COOLDOWN_SECONDS = int(os.getenv("QUOTA_COOLDOWN_SECONDS", "600"))
+
+
+class AllModelsExhausted(Exception):
+    """Kullanılabilir model kalmadığında fırlatılır"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(f"Tüm modellerin kotası dolu. {retry_after} saniye sonra tekrar deneyin.")
+
+
+def _cooldown_key(model_name: str) -> str:
+    return f"{QUOTA_KEY_PREFIX}{model_name}"
+
+
+async def mark_exhausted(client, model_name: str, cooldown: int = DEFAULT_COOLDOWN_SECONDS):
+    """Modeli cooldown süresince kullanılamaz olarak işaretle"""
+    until = time.time() + cooldown
+    # TTL sayesinde süre dolunca anahtar kendiliğinden silinir
+    await client.set(_cooldown_key(model_name), until, ex=cooldown)
+    print(f"🧊 {model_name} {cooldown} saniye boyunca devre dışı")
+
+
+async def get_cooldowns(client, models) -> dict:
+    """Her model için cooldown bitiş zamanını tek round-trip'te getir"""
+    values = await client.mget([_cooldown_key(m) for m in models])
+    now = time.time()
+    cooldowns = {}
+    for model_name, value in zip(models, values):
+        if value is not None and float(value) > now:
+            cooldowns[model_name] = float(value)
+    return cooldowns
+
+
+async def next_available_model(client, models, start_index: int = 0):
+    """start_index'ten başlayarak soğumada olmayan ilk modeli (index, isim) olarak döndür"""
+    cooldowns = await get_cooldowns(client, models)
+    for offset in range(len(models)):
+        index = (start_index + offset) % len(models)
+        if models[index] not in cooldowns:
+            return index, models[index]
+
+    retry_after = math.ceil(min(cooldowns.values()) - time.time())
+    raise AllModelsExhausted(max(retry_after, 1))
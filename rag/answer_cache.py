@@ -0,0 +1,211 @@
+# answer_cache.py
+"""
+RAG cevap önbelleği
+Aynı (normalize edilmiş soru, specialty, model ailesi) için üretilen cevap Redis'te
+saklanır. Girdiler TTL ile eskir; kapasite aşılınca en uzun süre kullanılmayan
+girdiler (LRU) silinir. İsteğe bağlı "semantic" modda, soru embedding'i önbellekteki
+bir soruya eşik değerinden daha benzerse o cevap döndürülür.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from .embeddings import embed_queries
+from .redis_client import get_redis
+
+ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_TTL = int(os.getenv("RAG_ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE_SEMANTIC", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_SEMANTIC_THRESHOLD", "0.95"))
+
+KEY_PREFIX = "rag:answer:"
+LRU_KEY = "rag:answer_lru"
+STATS_KEY = "rag:answer_stats"
+VECTORS_PREFIX = "rag:answer_vectors:"
+# Önbellek anahtarı -> vektörünün tutulduğu hash; silinen girdilerin vektörleri
+# SCAN yapmadan bulunup temizlenir
+VECTOR_OWNERS_KEY = "rag:answer_vector_owners"
+
+
+def normalize_question(question: str) -> str:
+    """Büyük/küçük harf, noktalama ve boşluk farklarını yok say"""
+    text = question.casefold()
+    text = re.sub(r"[^\w\s-]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def model_family(model_name: str) -> str:
+    """models/gemini-1.5-flash-002 -> gemini-1.5-flash"""
+    name = model_name.split("/")[-1]
+    return re.sub(r"-(latest|\d{3})$", "", name)
+
+
+def _cache_key(normalized: str, specialty: Optional[str], family: str) -> str:
+    digest = hashlib.sha256(f"{normalized}|{specialty or ''}|{family}".encode("utf-8")).hexdigest()[:32]
+    return f"{KEY_PREFIX}{digest}"
+
+
+def _vectors_key(specialty: Optional[str], family: str) -> str:
+    return f"{VECTORS_PREFIX}{specialty or 'all'}:{family}"
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def _record(client, field: str):
+    try:
+        client.hincrby(STATS_KEY, field, 1)
+    except Exception:
+        pass
+
+
+def _drop_vectors(client, members):
+    """Silinen önbellek girdilerinin semantic vektörlerini temizle"""
+    if not members:
+        return
+    owners = client.hmget(VECTOR_OWNERS_KEY, members)
+    by_vectors_key = {}
+    for member, vectors_key in zip(members, owners):
+        if vectors_key:
+            by_vectors_key.setdefault(vectors_key, []).append(member)
+    if not by_vectors_key:
+        return
+    with client.pipeline(transaction=False) as pipe:
+        for vectors_key, keys in by_vectors_key.items():
+            pipe.hdel(vectors_key, *keys)
+        pipe.hdel(VECTOR_OWNERS_KEY, *[k for keys in by_vectors_key.values() for k in keys])
+        pipe.execute()
+
+
+def _semantic_lookup(client, question: str, specialty: Optional[str], family: str):
+    """Embedding benzerliği eşiği geçen önbellek anahtarını bul"""
+    stored = client.hgetall(_vectors_key(specialty, family))
+    if not stored:
+        return None, None
+    query = embed_queries([question])[0]
+    keys = list(stored.keys())
+    matrix = np.stack([_decode_vector(stored[k]) for k in keys])
+    scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+    best = int(np.argmax(scores))
+    if scores[best] >= SEMANTIC_THRESHOLD:
+        return keys[best], query
+    return None, query
+
+
+def get_cached_answer(question: str, specialty: Optional[str], model_name: str) -> Optional[Dict]:
+    """Önbellekte cevap varsa döndür, yoksa None"""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        family = model_family(model_name)
+        key = _cache_key(normalize_question(question), specialty, family)
+        data = client.get(key)
+        hit_type = "hit"
+
+        if data is None and SEMANTIC_CACHE_ENABLED:
+            similar_key, _ = _semantic_lookup(client, question, specialty, family)
+            if similar_key:
+                data = client.get(similar_key)
+                key = similar_key
+                hit_type = "semantic_hit"
+                if data is None:
+                    # Süresi dolmuş girdinin vektörünü temizle
+                    _drop_vectors(client, [similar_key])
+
+        if data is None:
+            _record(client, "misses")
+            return None
+
+        # LRU sırasını güncelle
+        client.zadd(LRU_KEY, {key: time.time()})
+        _record(client, f"{hit_type}s")
+        result = json.loads(data)
+        if isinstance(result.get("query_info"), dict):
+            result["query_info"]["cache"] = hit_type
+        return result
+    except Exception as e:
+        print(f"⚠️ Cevap önbelleği okunamadı: {e}")
+        return None
+
+
+def store_answer(question: str, specialty: Optional[str], model_name: str, result: Dict):
+    """Üretilen cevabı önbelleğe yaz ve gerekirse LRU ile yer aç"""
+    if not ANSWER_CACHE_ENABLED:
+        return
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        family = model_family(model_name)
+        key = _cache_key(normalize_question(question), specialty, family)
+        now = time.time()
+
+        with client.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(result, ensure_ascii=False), ex=ANSWER_CACHE_TTL)
+            pipe.zadd(LRU_KEY, {key: now})
+            # TTL ile silinmiş girdileri LRU listesinden ve vektörlerden de çıkar
+            pipe.zrangebyscore(LRU_KEY, "-inf", now - ANSWER_CACHE_TTL)
+            pipe.zremrangebyscore(LRU_KEY, "-inf", now - ANSWER_CACHE_TTL)
+            pipe.zcard(LRU_KEY)
+            *_, expired, _, size = pipe.execute()
+        _drop_vectors(client, expired)
+
+        if SEMANTIC_CACHE_ENABLED:
+            vector = embed_queries([question])[0]
+            vectors_key = _vectors_key(specialty, family)
+            with client.pipeline(transaction=False) as pipe:
+                pipe.hset(vectors_key, key, _encode_vector(vector))
+                pipe.hset(VECTOR_OWNERS_KEY, key, vectors_key)
+                pipe.execute()
+
+        if size > ANSWER_CACHE_MAX_ENTRIES:
+            _evict(client, size - ANSWER_CACHE_MAX_ENTRIES)
+    except Exception as e:
+        print(f"⚠️ Cevap önbelleğe yazılamadı: {e}")
+
+
+def _evict(client, count: int):
+    """En uzun süre kullanılmayan girdileri sil"""
+    evicted = [member for member, _ in client.zpopmin(LRU_KEY, count)]
+    if not evicted:
+        return
+    with client.pipeline(transaction=False) as pipe:
+        pipe.delete(*evicted)
+        pipe.hincrby(STATS_KEY, "evictions", len(evicted))
+        pipe.execute()
+    _drop_vectors(client, evicted)
+
+
+def get_answer_cache_stats() -> Dict:
+    client = get_redis()
+    if client is None:
+        return {"enabled": False}
+    stats = {k: int(v) for k, v in client.hgetall(STATS_KEY).items()}
+    hits = stats.get("hits", 0) + stats.get("semantic_hits", 0)
+    lookups = hits + stats.get("misses", 0)
+    return {
+        "enabled": ANSWER_CACHE_ENABLED,
+        "semantic": SEMANTIC_CACHE_ENABLED,
+        "entries": client.zcard(LRU_KEY),
+        "max_entries": ANSWER_CACHE_MAX_ENTRIES,
+        "hit_rate": round(hits / lookups, 4) if lookups else None,
+        **stats,
+    }
@@ -0,0 +1,109 @@
+# chunk_reader.py
+"""
+Chunk dosyası okuyucu
+Kitap chunk'larını dosyanın tamamını belleğe almadan tek tek üretir.
+İki format desteklenir:
+- JSON dizisi: [ {...}, {...}, ... ]
+- JSON Lines: her satırda bir chunk nesnesi (.jsonl / .ndjson)
+"""
+
+import json
+from typing import Dict, Iterator
+
+READ_BLOCK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(buffer: str, pos: int) -> int:
+    while pos < len(buffer) and buffer[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _iter_json_array(f, block_size: int) -> Iterator[Dict]:
+    buffer = ""
+    eof = False
+    # Baştaki boşluklar bir bloktan uzun olabilir; ilk anlamlı karaktere kadar oku
+    while not eof and not buffer:
+        more = f.read(block_size)
+        eof = not more
+        buffer = more[_skip_whitespace(more, 0):]
+    pos = 0
+    if not buffer or buffer[pos] != "[":
+        raise ValueError("Chunk dosyası bir JSON dizisi ile başlamıyor")
+    pos += 1
+    expect_comma = False
+
+    while True:
+        pos = _skip_whitespace(buffer, pos)
+        # Tampon bittiyse veya eleman yarım kaldıysa devamını oku
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("Chunk dosyası beklenmedik şekilde bitti")
+            more = f.read(block_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        char = buffer[pos]
+        if char == "]":
+            return
+        if expect_comma:
+            if char != ",":
+                raise ValueError(f"Chunk dosyasında ',' bekleniyordu: {buffer[pos:pos + 20]!r}")
+            pos += 1
+            expect_comma = False
+            continue
+
+        try:
+            obj, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            obj, end = None, None
+        # Değer tamponun sonuna dayandıysa eksik olabilir (ör. sayı), daha fazla oku
+        if end is None or (end >= len(buffer) and not eof):
+            if eof:
+                raise ValueError("Chunk dosyasında geçersiz JSON")
+            more = f.read(block_size)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        yield obj
+        pos = end
+        expect_comma = True
+        # İşlenen kısmı at ki tampon büyümesin
+        if pos > block_size:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def _iter_json_lines(f) -> Iterator[Dict]:
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{line_no}. satırda geçersiz JSON: {e}")
+
+
+def iter_chunks(json_file_path: str, block_size: int = READ_BLOCK_SIZE) -> Iterator[Dict]:
+    """Chunk kayıtlarını dosyadan akış halinde üret"""
+    with open(json_file_path, 'r', encoding='utf-8-sig') as f:
+        if json_file_path.endswith((".jsonl", ".ndjson")):
+            yield from _iter_json_lines(f)
+            return
+
+        # Uzantı yoksa ilk karaktere bak
+        first = f.read(1)
+        while first and first in " \t\r\n\ufeff":
+            first = f.read(1)
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f, block_size)
+        else:
+            yield from _iter_json_lines(f)
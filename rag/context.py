@@ -0,0 +1,107 @@
+# context.py
+"""
+Bağlam oluşturma
+Sorgudan gelen aday chunk'lar ucuz bir yerel skorla yeniden sıralanır,
+birbirinin kopyası veya büyük ölçüde örtüşen chunk'lar elenir ve kalanlar
+ayarlanabilir bir token bütçesine sığacak kadar, sayfa bilgileriyle birlikte
+tek bir bağlam metnine paketlenir.
+"""
+
+import os
+from typing import Dict, List
+
+from .lexical_index import tokenize
+
+CONTEXT_CANDIDATES = int(os.getenv("RAG_CONTEXT_CANDIDATES", "8"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("RAG_CONTEXT_MAX_CHUNKS", "4"))
+# İki chunk'ın 3-gram örtüşme oranı bunun üzerindeyse ikincisi atılır
+DEDUP_THRESHOLD = float(os.getenv("RAG_CONTEXT_DEDUP_THRESHOLD", "0.6"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Kaba token tahmini (~4 karakter = 1 token)"""
+    return len(text) // 4 + 1
+
+
+def _shingles(tokens: List[str], size: int = 3) -> set:
+    if len(tokens) < size:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _overlap(a: set, b: set) -> float:
+    # Jaccard yerine örtüşme katsayısı: kısa bir chunk uzun olanın içindeyse de yakalanır
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def rerank(question: str, candidates: List[Dict]) -> List[Dict]:
+    """Sorgu terimlerinin kapsanma oranı ve retrieval sırasıyla yeniden sırala"""
+    query_terms = set(tokenize(question))
+    for rank, candidate in enumerate(candidates):
+        terms = set(candidate["tokens"])
+        coverage = len(query_terms & terms) / len(query_terms) if query_terms else 0.0
+        candidate["score"] = round(coverage + 1.0 / (rank + 2), 4)
+    return sorted(candidates, key=lambda c: c["score"], reverse=True)
+
+
+def assemble_context(question: str, db_results: Dict, token_budget: int = None,
+                     max_chunks: int = None) -> Dict:
+    """query_db_by_specialty sonucundan bütçeye sığan, tekrarsız bağlamı oluştur"""
+    token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+    max_chunks = max_chunks or CONTEXT_MAX_CHUNKS
+
+    documents = db_results["documents"][0] if db_results.get("documents") else []
+    metadatas = db_results["metadatas"][0] if db_results.get("metadatas") else [{}] * len(documents)
+
+    candidates = []
+    for document, metadata in zip(documents, metadatas):
+        if not document:
+            continue
+        tokens = tokenize(document)
+        candidates.append({
+            "text": document,
+            "metadata": metadata or {},
+            "tokens": tokens,
+            "shingles": _shingles(tokens),
+        })
+
+    selected = []
+    used_tokens = 0
+    for candidate in rerank(question, candidates):
+        if len(selected) >= max_chunks:
+            break
+        if any(_overlap(candidate["shingles"], s["shingles"]) >= DEDUP_THRESHOLD for s in selected):
+            continue
+        cost = estimate_tokens(candidate["text"])
+        if used_tokens + cost > token_budget:
+            if selected:
+                continue
+            # En iyi chunk tek başına bütçeyi aşıyorsa kırpılarak alınır
+            candidate["text"] = candidate["text"][:token_budget * 4]
+            cost = estimate_tokens(candidate["text"])
+        selected.append(candidate)
+        used_tokens += cost
+
+    parts = []
+    sources = []
+    for i, chunk in enumerate(selected, 1):
+        metadata = chunk["metadata"]
+        book_title = metadata.get("book_title", "Unknown")
+        page_number = metadata.get("page_number", "Unknown")
+        parts.append(f"[Source {i}: {book_title}, page {page_number}]\n{chunk['text']}")
+        sources.append({
+            "book_title": book_title,
+            "page_number": page_number,
+            "specialty": metadata.get("specialty", "Unknown"),
+            "score": chunk["score"],
+        })
+
+    return {
+        "context": "\n\n".join(parts),
+        "sources": sources,
+        "tokens": used_tokens,
+        "candidates": len(candidates),
+    }
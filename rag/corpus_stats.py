@@ -0,0 +1,115 @@
+# corpus_stats.py
+"""
+Korpus istatistikleri
+Specialty başına chunk sayıları süreç içinde ve Redis'te önbelleklenir.
+Sayılar load_book_to_db yazdıkça güncellenir; koleksiyonun tamamı yalnızca
+önbellek hiç yoksa bir kez taranır.
+"""
+
+import threading
+from typing import Dict
+
+from .redis_client import get_redis
+
+CORPUS_STATS_KEY = "rag:corpus_stats"
+
+# Süreç içi önbellek: specialty -> chunk sayısı
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def _scan_collection_counts(coll) -> Dict[str, int]:
+    """Tek seferlik tam tarama (önbellek boşken)"""
+    print("🔍 Korpus istatistikleri koleksiyondan hesaplanıyor...")
+    results = coll.get(include=["metadatas"])
+    counts = {}
+    for metadata in results.get("metadatas") or []:
+        specialty = metadata.get("specialty", "unknown")
+        counts[specialty] = counts.get(specialty, 0) + 1
+    return counts
+
+
+def _save_to_redis(counts: Dict[str, int]):
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        with client.pipeline(transaction=True) as pipe:
+            pipe.delete(CORPUS_STATS_KEY)
+            if counts:
+                pipe.hset(CORPUS_STATS_KEY, mapping=counts)
+            pipe.execute()
+    except Exception as e:
+        print(f"⚠️ Korpus istatistikleri Redis'e yazılamadı: {e}")
+
+
+def get_corpus_stats(coll, refresh: bool = False) -> Dict[str, int]:
+    """Specialty başına chunk sayılarını döndür (önce bellek, sonra Redis, en son tarama)"""
+    global _stats
+    if _stats is not None and not refresh:
+        return _stats
+
+    with _stats_lock:
+        if _stats is not None and not refresh:
+            return _stats
+
+        client = get_redis()
+        if client is not None and not refresh:
+            try:
+                cached = client.hgetall(CORPUS_STATS_KEY)
+                if cached:
+                    _stats = {k: int(v) for k, v in cached.items()}
+                    return _stats
+            except Exception as e:
+                print(f"⚠️ Korpus istatistikleri Redis'ten okunamadı: {e}")
+
+        counts = _scan_collection_counts(coll)
+        # Boş sonuç önbelleklenmez: setup CLI kitapları yükleyip Redis'e yazınca
+        # bu worker yeniden başlatılmadan yeni sayıları görebilmeli
+        if not counts:
+            return counts
+        _save_to_redis(counts)
+        _stats = counts
+        return _stats
+
+
+def record_book_loaded(coll, specialty: str, chunk_count: int):
+    """Bir kitap yüklendiğinde o specialty'nin sayısını güncelle"""
+    global _stats
+    # Önbellek hiç oluşmadıysa önce diğer kitaplarla birlikte oluştur
+    get_corpus_stats(coll)
+    with _stats_lock:
+        if _stats is not None:
+            _stats = {**_stats, specialty: chunk_count}
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.hset(CORPUS_STATS_KEY, specialty, chunk_count)
+    except Exception as e:
+        print(f"⚠️ Korpus istatistikleri Redis'e yazılamadı: {e}")
+
+
+def invalidate_corpus_stats():
+    """Database sıfırlandığında önbelleği temizle"""
+    global _stats
+    with _stats_lock:
+        _stats = None
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(CORPUS_STATS_KEY)
+    except Exception as e:
+        print(f"⚠️ Korpus istatistikleri silinemedi: {e}")
+
+
+def seed_corpus_stats(counts: Dict[str, int]):
+    """Sayılar başka bir kaynaktan (snapshot manifest'i) biliniyorsa taramadan önbelleğe yaz"""
+    global _stats
+    counts = {specialty: int(count) for specialty, count in counts.items()}
+    if not counts:
+        return
+    with _stats_lock:
+        _stats = counts
+    _save_to_redis(counts)
@@ -0,0 +1,126 @@
+# embeddings.py
+"""
+Sorgu embedding'leri
+Koleksiyon oluşturulurken kullanılan varsayılan Chroma embedding fonksiyonu
+(all-MiniLM-L6-v2, ONNX) burada tek bir örnek olarak tutulur.
+Sorgu embedding'leri iki katmanlı önbellekte saklanır: süreç içi LRU ve
+worker'lar arasında paylaşılan Redis. Anahtar, metnin hash'i ve model kimliğidir.
+"""
+
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+from .redis_client import get_redis
+
+# Embedding önbellek anahtarlarında ve manifestlerde kullanılan model kimliği
+EMBEDDING_MODEL_ID = "all-MiniLM-L6-v2"
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = int(os.getenv("RAG_EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Lazy loading için global değişken
+_embedding_function = None
+_embedding_lock = threading.Lock()
+
+# Süreç içi LRU: önbellek anahtarı -> vektör
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+embedding_cache_stats = {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def get_embedding_function():
+    global _embedding_function
+    if _embedding_function is None:
+        with _embedding_lock:
+            if _embedding_function is None:
+                _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _embedding_function
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Metinleri (n, boyut) float32 matris olarak embed et (önbelleksiz)"""
+    vectors = get_embedding_function()(list(texts))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _embed_uncached(texts: List[str]) -> np.ndarray:
+    # Sidecar modunda model bu süreçte yüklenmez
+    from .sidecar import sidecar_enabled, get_sidecar_client
+    if sidecar_enabled():
+        return np.asarray(get_sidecar_client().embed(texts), dtype=np.float32)
+    return embed_texts(texts)
+
+
+def _cache_key(text: str) -> str:
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    return f"rag:emb:{EMBEDDING_MODEL_ID}:{digest}"
+
+
+def _remember(key: str, vector: np.ndarray):
+    with _memory_lock:
+        _memory_cache[key] = vector
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > EMBEDDING_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """Sorguları önbellek üzerinden embed et; yalnızca hiç görülmemiş metinler modele gider"""
+    keys = [_cache_key(t) for t in texts]
+    vectors = [None] * len(texts)
+
+    with _memory_lock:
+        for i, key in enumerate(keys):
+            vector = _memory_cache.get(key)
+            if vector is not None:
+                _memory_cache.move_to_end(key)
+                vectors[i] = vector
+                embedding_cache_stats["memory_hits"] += 1
+
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    client = get_redis()
+    if missing and client is not None:
+        try:
+            stored = client.mget([keys[i] for i in missing])
+            for i, data in zip(missing, stored):
+                if data:
+                    vectors[i] = np.frombuffer(base64.b64decode(data), dtype=np.float32)
+                    _remember(keys[i], vectors[i])
+                    embedding_cache_stats["redis_hits"] += 1
+        except Exception as e:
+            print(f"⚠️ Embedding önbelleği okunamadı: {e}")
+        missing = [i for i, v in enumerate(vectors) if v is None]
+
+    if missing:
+        embedding_cache_stats["misses"] += len(missing)
+        computed = _embed_uncached([texts[i] for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+            _remember(keys[i], vector)
+        if client is not None:
+            try:
+                with client.pipeline(transaction=False) as pipe:
+                    for i in missing:
+                        encoded = base64.b64encode(vectors[i].tobytes()).decode("ascii")
+                        pipe.set(keys[i], encoded, ex=EMBEDDING_CACHE_TTL)
+                    pipe.execute()
+            except Exception as e:
+                print(f"⚠️ Embedding önbelleğe yazılamadı: {e}")
+
+    return np.stack(vectors)
+
+
+def get_embedding_cache_info():
+    return {
+        "model": EMBEDDING_MODEL_ID,
+        "memory_entries": len(_memory_cache),
+        "memory_capacity": EMBEDDING_CACHE_SIZE,
+        **embedding_cache_stats,
+    }
@@ -0,0 +1,278 @@
+# flat_index.py
+"""
+NumPy düz vektör motoru
+Korpus küçük olduğu için (on ders kitabı) Chroma'nın SQLite + HNSW yığını yerine
+embedding'ler tek bir float16 matriste (.npy, memory-mapped) tutulur. Satırlar
+specialty'ye göre sıralıdır; her specialty'nin satır aralığı manifest'te yazılır,
+böylece filtreli sorgu yalnızca o dilimi tarar. Metadata sütun bazlı küçük
+dosyalarda durur: metinler tek bir UTF-8 blob + ofsetler, kitap adı ve sayfa
+numarası sözlük kodlu diziler. Sorgu vektörleştirilmiş tam (exact) top-k'dır.
+Dosyalar mmap ile açıldığı için aynı makinedeki worker'lar sayfa önbelleğini
+paylaşır; kopya yapılmaz.
+
+FlatIndex, rag.rag'in kullandığı Collection arayüzünün okuma kısmını
+(query/get/count) sunar.
+"""
+
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .embeddings import EMBEDDING_MODEL_ID
+
+FLAT_FORMAT = 1
+FLAT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "flat")
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")  # chroma | flat
+# Skorlar bu kadar satırlık bloklarla hesaplanır (geçici float32 kopyayı sınırlar)
+FLAT_BLOCK_ROWS = int(os.getenv("RAG_FLAT_BLOCK_ROWS", "16384"))
+
+_DEFAULT_GET_INCLUDE = ["metadatas", "documents"]
+_DEFAULT_QUERY_INCLUDE = ["metadatas", "documents", "distances"]
+
+
+def _encode_strings(values: List[str]):
+    """Metin listesini (UTF-8 blob, ofsetler) olarak kodla"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _encode_categorical(values: List):
+    """Sözlük kodlama; eksik değerler None kategorisiyle tutulur"""
+    categories = sorted(set(values), key=lambda value: (type(value).__name__, str(value)))
+    lookup = {value: i for i, value in enumerate(categories)}
+    return categories, np.array([lookup[value] for value in values], dtype=np.int32)
+
+
+def build_flat_index(coll, path: Optional[str] = None, page_size: int = 1000) -> Dict:
+    """Koleksiyondaki tüm chunk'ları (embedding'leriyle) düz indekse aktar"""
+    path = path or FLAT_INDEX_PATH
+    rows = []
+    embeddings = []
+    offset = 0
+    while True:
+        page = coll.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        for chunk_id, document, metadata, embedding in zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"]):
+            rows.append((metadata.get("specialty", "unknown"), int(metadata.get("chunk_index", 0)), chunk_id, document or "", metadata))
+            embeddings.append(np.asarray(embedding, dtype=np.float32))
+        offset += len(page["ids"])
+
+    if not rows:
+        raise ValueError("Koleksiyon boş, düz indeks oluşturulmadı")
+
+    # Specialty'ye göre sırala ki her specialty ardışık bir satır aralığı olsun
+    order = sorted(range(len(rows)), key=lambda i: (rows[i][0], rows[i][1]))
+    rows = [rows[i] for i in order]
+    matrix = np.stack([embeddings[i] for i in order])
+
+    ranges = {}
+    for i, (specialty, *_rest) in enumerate(rows):
+        start, _ = ranges.get(specialty, (i, i))
+        ranges[specialty] = (start, i + 1)
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    stored = np.lib.format.open_memmap(os.path.join(tmp_path, "embeddings.npy"), mode="w+",
+                                       dtype=np.float16, shape=matrix.shape)
+    stored[:] = matrix.astype(np.float16)
+    stored.flush()
+    del stored
+    # Mesafe hesabı için float16 vektörlerin kare normları
+    np.save(os.path.join(tmp_path, "norms.npy"), np.square(matrix.astype(np.float16).astype(np.float32)).sum(axis=1))
+
+    blob, offsets = _encode_strings([row[3] for row in rows])
+    np.save(os.path.join(tmp_path, "documents.npy"), blob)
+    np.save(os.path.join(tmp_path, "doc_offsets.npy"), offsets)
+
+    id_blob, id_offsets = _encode_strings([row[2] for row in rows])
+    np.save(os.path.join(tmp_path, "ids.npy"), id_blob)
+    np.save(os.path.join(tmp_path, "id_offsets.npy"), id_offsets)
+
+    # specialty satır aralıklarından, chunk_index ayrı sütundan gelir; diğer alanlar sözlük kodlu
+    column_names = sorted({key for row in rows for key in row[4]} - {"specialty", "chunk_index"})
+    columns = {}
+    for name in column_names:
+        categories, codes = _encode_categorical([row[4].get(name) for row in rows])
+        np.save(os.path.join(tmp_path, f"col_{name}.npy"), codes)
+        columns[name] = categories
+    np.save(os.path.join(tmp_path, "col_chunk_index.npy"), np.array([row[1] for row in rows], dtype=np.int32))
+
+    manifest = {
+        "format": FLAT_FORMAT,
+        "embedding_model": EMBEDDING_MODEL_ID,
+        "count": len(rows),
+        "dim": int(matrix.shape[1]),
+        "ranges": ranges,
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_path, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    print(f"✅ Düz vektör indeksi oluşturuldu: {len(rows)} chunk, {matrix.shape[1]} boyut, "
+          f"{os.path.getsize(os.path.join(path, 'embeddings.npy')) / 1e6:.1f} MB")
+    return manifest
+
+
+class FlatIndex:
+    def __init__(self, path: Optional[str] = None):
+        path = path or FLAT_INDEX_PATH
+        with open(os.path.join(path, "manifest.json"), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("embedding_model") != EMBEDDING_MODEL_ID:
+            raise ValueError(f"Düz indeks farklı embedding modeliyle oluşturulmuş: {self.manifest.get('embedding_model')}")
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.path = path
+        self.name = "flat"
+        self.embeddings = load("embeddings")
+        self.norms = load("norms")
+        self.documents = load("documents")
+        self.doc_offsets = load("doc_offsets")
+        self.ids = load("ids")
+        self.id_offsets = load("id_offsets")
+        self.chunk_index = load("col_chunk_index")
+        self.columns = {name: (categories, load(f"col_{name}")) for name, categories in self.manifest["columns"].items()}
+        self.ranges = {specialty: tuple(bounds) for specialty, bounds in self.manifest["ranges"].items()}
+        self._row_specialty = None
+        self._row_of_id = None
+
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    def chunk_counts(self) -> Dict[str, int]:
+        return {specialty: end - start for specialty, (start, end) in self.ranges.items()}
+
+    def _string(self, blob, offsets, row: int) -> str:
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def _specialty_of_row(self, row: int) -> str:
+        for specialty, (start, end) in self.ranges.items():
+            if start <= row < end:
+                return specialty
+        return "unknown"
+
+    def _metadata(self, row: int) -> Dict:
+        metadata = {"specialty": self._specialty_of_row(row), "chunk_index": int(self.chunk_index[row])}
+        for name, (categories, codes) in self.columns.items():
+            value = categories[codes[row]]
+            if value is not None:
+                metadata[name] = value
+        return metadata
+
+    def _rows_result(self, rows, include) -> Dict:
+        result = {"ids": [self._string(self.ids, self.id_offsets, row) for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self._string(self.documents, self.doc_offsets, row) for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadata(row) for row in rows]
+        return result
+
+    def _row_lookup(self) -> Dict[str, int]:
+        if self._row_of_id is None:
+            self._row_of_id = {self._string(self.ids, self.id_offsets, row): row for row in range(self.count())}
+        return self._row_of_id
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, include=None,
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict:
+        include = _DEFAULT_GET_INCLUDE if include is None else include
+        if ids is not None:
+            lookup = self._row_lookup()
+            rows = [lookup[chunk_id] for chunk_id in ids if chunk_id in lookup]
+        else:
+            start, end = self._bounds(where)
+            start = start + (offset or 0)
+            end = min(end, start + limit) if limit is not None else end
+            rows = range(start, max(start, end))
+        result = self._rows_result(rows, include)
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self.embeddings[list(rows)], dtype=np.float32)
+        return result
+
+    def _bounds(self, where: Optional[Dict]):
+        specialty = (where or {}).get("specialty")
+        if isinstance(specialty, dict):
+            specialty = specialty.get("$eq")
+        if specialty:
+            return self.ranges.get(specialty, (0, 0))
+        return 0, self.count()
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None, include=None) -> Dict:
+        """Kare L2 mesafesiyle tam top-k (Chroma'nın varsayılan l2 uzayıyla aynı ölçü)"""
+        include = _DEFAULT_QUERY_INCLUDE if include is None else include
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        start, end = self._bounds(where)
+        k = min(n_results, end - start)
+
+        result = {"ids": [], "distances": []}
+        for key in ("documents", "metadatas"):
+            if key in include:
+                result[key] = []
+        if k <= 0:
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+
+        query_norms = np.square(queries).sum(axis=1)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        for block_start in range(start, end, FLAT_BLOCK_ROWS):
+            block_end = min(block_start + FLAT_BLOCK_ROWS, end)
+            block = np.asarray(self.embeddings[block_start:block_end], dtype=np.float32)
+            # ||q - x||² = ||q||² - 2 q·x + ||x||²
+            distances = query_norms[:, None] - 2 * queries @ block.T + self.norms[block_start:block_end][None, :]
+            rows = np.broadcast_to(np.arange(block_start, block_end), distances.shape)
+            best_distances = np.concatenate([best_distances, distances], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_distances.shape[1] > k:
+                keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_distances = np.take_along_axis(best_distances, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(best_distances, axis=1)
+        best_distances = np.take_along_axis(best_distances, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        for rows, distances in zip(best_rows, best_distances):
+            part = self._rows_result([int(row) for row in rows], include)
+            for key in part:
+                result[key].append(part[key])
+            result["distances"].append([max(float(d), 0.0) for d in distances])
+        return result
+
+
+# Lazy loading için global değişken
+_flat_index = None
+_flat_lock = threading.Lock()
+
+
+def flat_backend_enabled() -> bool:
+    return VECTOR_BACKEND == "flat"
+
+
+def get_flat_index() -> Optional[FlatIndex]:
+    """Düz indeksi mmap ile bir kez aç (dosya yoksa None)"""
+    global _flat_index
+    if _flat_index is None:
+        with _flat_lock:
+            if _flat_index is None and os.path.exists(os.path.join(FLAT_INDEX_PATH, "manifest.json")):
+                _flat_index = FlatIndex(FLAT_INDEX_PATH)
+    return _flat_index
+
+
+def reset_flat_index():
+    global _flat_index
+    with _flat_lock:
+        _flat_index = None
@@ -0,0 +1,319 @@
+# ingest.py
+"""
+Kitap yükleme hattı
+Chunk'lar sabit boyutlu batch'ler halinde embed edilip Chroma'ya yazılır.
+Her batch commit edildikten sonra kitap için bir checkpoint kaydedilir; yarıda
+kalan yükleme tekrar çalıştırıldığında kaldığı batch'ten devam eder.
+Embedding ve yazma süreleri ayrı ayrı ölçülür.
+sync_book ise her chunk'ın içerik hash'ini karşılaştırarak yalnızca yeni veya
+değişmiş chunk'ları embed eder ve kitaptan çıkarılmış chunk'ları siler.
+ingest_books_parallel embedding'leri bir process havuzunda hesaplar; Chroma'ya
+yalnızca ana süreç (tek yazıcı) yazar.
+Her yolda BM25 sözcük indeksi de aynı chunk'larla güncellenip kaydedilir.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Optional
+
+from .chunk_reader import iter_chunks
+from .embeddings import embed_texts
+from .lexical_index import get_lexical_index, save_lexical_index
+
+INGEST_BATCH_SIZE = int(os.getenv("RAG_INGEST_BATCH_SIZE", "128"))
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "0")) or os.cpu_count() or 1
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "ingest_checkpoints")
+
+
+def chunk_to_record(specialty: str, index: int, chunk: Dict):
+    """Chunk'ı (id, içerik, metadata) üçlüsüne çevir; boş chunk için None"""
+    chunk_id = f"{specialty}_{index}"
+    content = chunk.get('content', chunk.get('text', ''))
+    if not content:
+        print(f"⚠️ Boş chunk atlanıyor: {chunk_id}")
+        return None
+
+    metadata = {
+        "specialty": specialty,
+        "book_title": chunk.get('book_title', f"{specialty.title()} Medical Book"),
+        "page_number": str(chunk.get('page_number', chunk.get('page', 'Unknown'))),
+        "chunk_index": index,
+        "source_type": "medical_textbook"
+    }
+    metadata["content_hash"] = content_hash(content, metadata)
+    return chunk_id, content, metadata
+
+
+def content_hash(content: str, metadata: Dict) -> str:
+    """İçerik ve metadata değişmediyse aynı kalan kısa hash"""
+    payload = json.dumps([content, {k: v for k, v in metadata.items() if k != "content_hash"}],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def iter_batches(iterable: Iterable, size: int):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _checkpoint_path(specialty: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{specialty}.json")
+
+
+def _file_signature(json_file_path: str) -> Dict:
+    stat = os.stat(json_file_path)
+    return {"file": os.path.abspath(json_file_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_checkpoint(specialty: str, json_file_path: str, batch_size: int) -> int:
+    """Aynı dosya ve batch boyutu için commit edilmiş batch sayısını döndür (yoksa 0)"""
+    path = _checkpoint_path(specialty)
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    # Dosya veya batch boyutu değiştiyse baştan başla
+    if checkpoint.get("signature") != _file_signature(json_file_path):
+        return 0
+    if checkpoint.get("batch_size") != batch_size:
+        return 0
+    return checkpoint.get("batches_committed", 0)
+
+
+def save_checkpoint(specialty: str, json_file_path: str, batch_size: int, batches_committed: int):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    path = _checkpoint_path(specialty)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "signature": _file_signature(json_file_path),
+            "batch_size": batch_size,
+            "batches_committed": batches_committed,
+            "updated_at": time.time(),
+        }, f)
+    # Yarım yazılmış checkpoint kalmasın
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(specialty: str):
+    path = _checkpoint_path(specialty)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def ingest_book(coll, specialty: str, json_file_path: str, batch_size: Optional[int] = None, resume: bool = True) -> Dict:
+    """Kitabı batch batch yükle ve throughput istatistiklerini döndür"""
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    # Chunk'lar dosyadan akış halinde okunur; tüm kitap belleğe alınmaz
+    chunks = iter_chunks(json_file_path)
+
+    start_batch = load_checkpoint(specialty, json_file_path, batch_size) if resume else 0
+    if start_batch:
+        print(f"⏩ {specialty}: {start_batch}. batch'ten devam ediliyor")
+
+    stats = {"chunks": 0, "written": 0, "batches": 0, "skipped_batches": start_batch,
+             "embed_seconds": 0.0, "write_seconds": 0.0}
+    started = time.perf_counter()
+    lexical_index = get_lexical_index(coll)
+
+    for batch_no, batch in enumerate(iter_batches(enumerate(chunks), batch_size)):
+        records = [r for r in (chunk_to_record(specialty, i, c) for i, c in batch) if r]
+        stats["chunks"] += len(records)
+        # Atlanan batch'ler de indekslenir; indeks yalnızca kitap bitince kaydedilir
+        for chunk_id, content, _ in records:
+            lexical_index.add(chunk_id, content, specialty)
+        if batch_no < start_batch or not records:
+            continue
+
+        ids, documents, metadatas = map(list, zip(*records))
+
+        t0 = time.perf_counter()
+        embeddings = embed_texts(documents)
+        t1 = time.perf_counter()
+        # upsert: yarıda kalmış bir batch tekrar yazılırsa kopya oluşmaz
+        coll.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings.tolist())
+        t2 = time.perf_counter()
+
+        save_checkpoint(specialty, json_file_path, batch_size, batch_no + 1)
+
+        stats["batches"] += 1
+        stats["written"] += len(records)
+        stats["embed_seconds"] += t1 - t0
+        stats["write_seconds"] += t2 - t1
+        elapsed = time.perf_counter() - started
+        print(f"  📦 {specialty} batch {batch_no + 1}: {stats['written']} chunk yazıldı "
+              f"({stats['written'] / elapsed:.1f} chunk/s, embed {t1 - t0:.2f}s, yazma {t2 - t1:.2f}s)")
+
+    save_lexical_index()
+    clear_checkpoint(specialty)
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["chunks_per_second"] = round(stats["written"] / elapsed, 1) if elapsed > 0 else None
+    stats["embed_seconds"] = round(stats["embed_seconds"], 3)
+    stats["write_seconds"] = round(stats["write_seconds"], 3)
+    return stats
+
+
+def _write_batch(coll, records, stats):
+    ids, documents, metadatas = map(list, zip(*records))
+    t0 = time.perf_counter()
+    embeddings = embed_texts(documents)
+    t1 = time.perf_counter()
+    coll.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings.tolist())
+    stats["embed_seconds"] += t1 - t0
+    stats["write_seconds"] += time.perf_counter() - t1
+
+
+def _embed_in_worker(documents):
+    """Process havuzunda çalışır; her worker embedding modelini bir kez yükler"""
+    t0 = time.perf_counter()
+    embeddings = embed_texts(documents)
+    return embeddings, time.perf_counter() - t0
+
+
+def _book_batches(specialty: str, json_file_path: str, batch_size: int, resume: bool, stats: Dict):
+    """Kitabın yazılması gereken batch'lerini (batch_no, kayıtlar) olarak üret"""
+    # Chunk'lar dosyadan akış halinde okunur; tüm kitap belleğe alınmaz
+    chunks = iter_chunks(json_file_path)
+
+    start_batch = load_checkpoint(specialty, json_file_path, batch_size) if resume else 0
+    if start_batch:
+        print(f"⏩ {specialty}: {start_batch}. batch'ten devam ediliyor")
+    stats["skipped_batches"] = start_batch
+    lexical_index = get_lexical_index()
+
+    for batch_no, batch in enumerate(iter_batches(enumerate(chunks), batch_size)):
+        records = [r for r in (chunk_to_record(specialty, i, c) for i, c in batch) if r]
+        stats["chunks"] += len(records)
+        for chunk_id, content, _ in records:
+            lexical_index.add(chunk_id, content, specialty)
+        if batch_no >= start_batch and records:
+            yield batch_no, records
+
+
+def ingest_books_parallel(coll, books_config: Dict[str, str], batch_size: Optional[int] = None,
+                          workers: Optional[int] = None, resume: bool = True, mp_context: str = "spawn") -> Dict[str, Dict]:
+    """Birden çok kitabı paralel embed et, tek yazıcıyla sırayla commit et"""
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    workers = workers or INGEST_WORKERS
+    # Bellekte bekleyen batch sayısı sınırlı: en fazla worker başına iki batch
+    max_in_flight = workers * 2
+    started = time.perf_counter()
+
+    all_stats = {
+        specialty: {"chunks": 0, "written": 0, "batches": 0, "skipped_batches": 0,
+                    "embed_seconds": 0.0, "write_seconds": 0.0}
+        for specialty in books_config
+    }
+
+    def jobs():
+        for specialty, json_file_path in books_config.items():
+            for batch_no, records in _book_batches(specialty, json_file_path, batch_size, resume, all_stats[specialty]):
+                yield specialty, json_file_path, batch_no, records
+
+    def commit(specialty, json_file_path, batch_no, records, future):
+        stats = all_stats[specialty]
+        embeddings, embed_seconds = future.result()
+        ids, documents, metadatas = map(list, zip(*records))
+        t0 = time.perf_counter()
+        coll.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings.tolist())
+        stats["write_seconds"] += time.perf_counter() - t0
+        stats["embed_seconds"] += embed_seconds
+        stats["batches"] += 1
+        stats["written"] += len(records)
+        save_checkpoint(specialty, json_file_path, batch_size, batch_no + 1)
+
+    print(f"🚀 Paralel yükleme: {len(books_config)} kitap, {workers} worker, batch {batch_size}")
+    get_lexical_index(coll)
+    in_flight = deque()
+    context = multiprocessing.get_context(mp_context)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for specialty, json_file_path, batch_no, records in jobs():
+            future = pool.submit(_embed_in_worker, [r[1] for r in records])
+            in_flight.append((specialty, json_file_path, batch_no, records, future))
+            # Sırayla commit et ki checkpoint'ler ardışık kalsın
+            while len(in_flight) >= max_in_flight:
+                commit(*in_flight.popleft())
+        while in_flight:
+            commit(*in_flight.popleft())
+
+    save_lexical_index()
+    for specialty, stats in all_stats.items():
+        clear_checkpoint(specialty)
+        stats["embed_seconds"] = round(stats["embed_seconds"], 3)
+        stats["write_seconds"] = round(stats["write_seconds"], 3)
+
+    elapsed = time.perf_counter() - started
+    total = sum(stats["written"] for stats in all_stats.values())
+    print(f"✅ Paralel yükleme bitti: {total} chunk, {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} chunk/s)")
+    return all_stats
+
+
+def sync_book(coll, specialty: str, json_file_path: str, batch_size: Optional[int] = None) -> Dict:
+    """Kitabı artımlı güncelle: yeni/değişen chunk'ları upsert et, silinenleri kaldır"""
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    started = time.perf_counter()
+
+    # Mevcut chunk'ların hash'leri (embedding ve içerik çekilmez)
+    existing = coll.get(where={"specialty": specialty}, include=["metadatas"])
+    existing_hashes = {
+        chunk_id: (metadata or {}).get("content_hash")
+        for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+
+    # Chunk'lar dosyadan akış halinde okunur; tüm kitap belleğe alınmaz
+    chunks = iter_chunks(json_file_path)
+
+    stats = {"chunks": 0, "added": 0, "updated": 0, "unchanged": 0, "deleted": 0,
+             "embed_seconds": 0.0, "write_seconds": 0.0}
+    seen = set()
+    pending = []
+    lexical_index = get_lexical_index(coll)
+
+    for i, chunk in enumerate(chunks):
+        record = chunk_to_record(specialty, i, chunk)
+        if not record:
+            continue
+        chunk_id, content, metadata = record
+        seen.add(chunk_id)
+        stats["chunks"] += 1
+        lexical_index.add(chunk_id, content, specialty)
+
+        old_hash = existing_hashes.get(chunk_id)
+        if old_hash == metadata["content_hash"]:
+            stats["unchanged"] += 1
+            continue
+        stats["updated" if chunk_id in existing_hashes else "added"] += 1
+        pending.append(record)
+        if len(pending) >= batch_size:
+            _write_batch(coll, pending, stats)
+            pending = []
+
+    if pending:
+        _write_batch(coll, pending, stats)
+
+    removed = [chunk_id for chunk_id in existing_hashes if chunk_id not in seen]
+    for batch in iter_batches(removed, batch_size):
+        coll.delete(ids=batch)
+    for chunk_id in removed:
+        lexical_index.remove(chunk_id)
+    stats["deleted"] = len(removed)
+    save_lexical_index()
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["embed_seconds"] = round(stats["embed_seconds"], 3)
+    stats["write_seconds"] = round(stats["write_seconds"], 3)
+    return stats
@@ -0,0 +1,194 @@
+# lexical_index.py
+"""
+BM25 sözcük indeksi
+Vektör aramanın kaçırdığı birebir terimler (ilaç adları, lab kısaltmaları,
+"CHA2DS2-VASc" gibi skorlar) için Chroma'daki chunk'ların üzerinde süreç içi
+bir ters indeks tutulur. İndeks ingestion sırasında güncellenir ve rag/db
+içinde JSON olarak saklanır; sorgu anında vektör sonuçlarıyla RRF ile birleştirilir.
+"""
+
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+LEXICAL_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "lexical_index.json")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+(?:[-/.]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Birleşik terimleri (cha2ds2-vasc) hem bütün hem parça olarak indeksle"""
+    tokens = []
+    for match in _TOKEN_RE.findall(text.casefold()):
+        tokens.append(match)
+        if any(sep in match for sep in "-/."):
+            tokens.extend(part for part in re.split(r"[-/.]", match) if part)
+    return tokens
+
+
+class LexicalIndex:
+    def __init__(self):
+        # doc_id -> (specialty, {terim: frekans})
+        self.docs: Dict[str, Tuple[str, Dict[str, int]]] = {}
+        # terim -> {doc_id: frekans}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, doc_id: str, text: str, specialty: str):
+        terms = dict(Counter(tokenize(text)))
+        with self._lock:
+            self._remove(doc_id)
+            self._insert(doc_id, specialty, terms)
+            self.dirty = True
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            self._remove(doc_id)
+            self.dirty = True
+
+    def _insert(self, doc_id, specialty, terms):
+        self.docs[doc_id] = (specialty, terms)
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def _remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        _, terms = entry
+        self.total_length -= self.doc_lengths.pop(doc_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query: str, specialty: Optional[str] = None, k: int = 10) -> List[Tuple[str, float]]:
+        """BM25 skoruna göre (doc_id, skor) listesi"""
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs if n_docs else 0
+        scores = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                if specialty and self.docs[doc_id][0] != specialty:
+                    continue
+                length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / (avg_length or 1)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def save(self, path: Optional[str] = None):
+        path = path or LEXICAL_INDEX_PATH
+        with self._lock:
+            data = {"version": 1, "docs": self.docs}
+            self.dirty = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Süreç başına ayrı geçici dosya: birden çok worker veya CLI aynı anda kaydedebilir
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "LexicalIndex":
+        index = cls()
+        with open(path or LEXICAL_INDEX_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for doc_id, (specialty, terms) in data.get("docs", {}).items():
+            index._insert(doc_id, specialty, terms)
+        return index
+
+
+# Lazy loading için global değişken
+_lexical_index = None
+_lexical_lock = threading.Lock()
+
+
+def build_from_collection(coll, page_size: int = 1000) -> LexicalIndex:
+    """İndeks dosyası yoksa koleksiyondan bir kez oluştur"""
+    print("🔤 Sözcük indeksi koleksiyondan oluşturuluyor...")
+    index = LexicalIndex()
+    offset = 0
+    while True:
+        page = coll.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+            index.add(doc_id, document or "", (metadata or {}).get("specialty", "unknown"))
+        offset += len(page["ids"])
+    index.save()
+    print(f"✅ Sözcük indeksi hazır: {len(index)} chunk")
+    return index
+
+
+def get_lexical_index(coll=None) -> LexicalIndex:
+    """İndeksi diskten yükle; yoksa veya bozuksa ve koleksiyon verildiyse ondan oluştur"""
+    global _lexical_index
+    if _lexical_index is None:
+        with _lexical_lock:
+            if _lexical_index is None:
+                if os.path.exists(LEXICAL_INDEX_PATH):
+                    try:
+                        _lexical_index = LexicalIndex.load(LEXICAL_INDEX_PATH)
+                        return _lexical_index
+                    except (OSError, ValueError, TypeError, AttributeError) as e:
+                        print(f"⚠️ Sözcük indeksi okunamadı, yeniden oluşturulacak: {e}")
+                        if coll is None:
+                            # Koleksiyon olmadan yeniden oluşturulamaz; boş indeksle arama
+                            # yalnızca vektörle yapılır, sonraki çağrı tekrar dener
+                            return LexicalIndex()
+                if coll is not None and coll.count() > 0:
+                    _lexical_index = build_from_collection(coll)
+                else:
+                    _lexical_index = LexicalIndex()
+    return _lexical_index
+
+
+def save_lexical_index():
+    if _lexical_index is not None and _lexical_index.dirty:
+        _lexical_index.save()
+
+
+def reset_lexical_index():
+    global _lexical_index
+    with _lexical_lock:
+        _lexical_index = None
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Birden çok sıralamayı RRF ile birleştir"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,17 +1,37 @@
 # rag.py
 import os
-import json
 import shutil
+import asyncio
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import chromadb
 from typing import Dict, List, Optional
 import google.generativeai as genai
 from google.api_core.exceptions import ResourceExhausted
 
+from .answer_cache import get_cached_answer, store_answer
+from .embeddings import embed_queries
+from .ingest import ingest_book, ingest_books_parallel, sync_book
+from .corpus_stats import get_corpus_stats, record_book_loaded, invalidate_corpus_stats, seed_corpus_stats
+from .lexical_index import get_lexical_index, reset_lexical_index, reciprocal_rank_fusion
+from .snapshot import build_snapshot, mount_snapshot, read_mounted_manifest, clear_mounted_manifest
+from .sidecar import sidecar_enabled, get_sidecar_client
+from .shards import COLLECTION_NAME, COLLECTION_LAYOUT, ShardedCollection, open_collection
+from .flat_index import build_flat_index, flat_backend_enabled, get_flat_index, reset_flat_index
+from .context import assemble_context, CONTEXT_CANDIDATES
+
 
 load_dotenv()
 
+# Hibrit arama: vektör ve BM25 sonuçları RRF ile birleştirilir
+HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "1") == "1"
+# Her iki aramadan da birleştirmeden önce alınan aday sayısı
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "10"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+_search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-search")
+
 # Lazy loading için global değişkenler
 chroma_client = None
 collection = None
@@ -19,6 +39,21 @@ collection = None
 def ensure_database_ready():
     """Production'da database'in hazır olduğundan emin ol"""
     try:
+        # Sidecar modunda Chroma'nın sahibi sidecar süreci; burada yalnızca durumu sorulur
+        if sidecar_enabled():
+            db_info = get_database_info()
+            ready = "error" not in db_info and db_info.get('total_chunks', 0) > 0
+            print("✅ Database hazır (sidecar)" if ready else f"⚠️ Sidecar database hazır değil: {db_info}")
+            return ready
+        
+        # Dağıtılan snapshot Chroma açılmadan önce kullanıma alınır; yalnızca manifest okunur
+        manifest = mount_snapshot() if chroma_client is None else read_mounted_manifest()
+        if manifest:
+            # Chunk sayıları manifest'ten gelir, koleksiyon taranmaz
+            seed_corpus_stats(manifest["chunk_counts"])
+            print(f"✅ Database hazır (snapshot {manifest['version']}, {manifest['total_chunks']} chunk)")
+            return True
+        
         # Database durumunu kontrol et
         db_info = get_database_info()
         
@@ -51,7 +86,11 @@ def initialize_chroma():
             
             chroma_client = chromadb.PersistentClient(path=db_path)
             # Artık database'i silmiyoruz, mevcut koleksiyonu kullanıyoruz
-            collection = chroma_client.get_or_create_collection(name="medical_books")
+            if COLLECTION_LAYOUT == "sharded":
+                # Her specialty kendi koleksiyonunda; filtreli sorgular yalnızca o shard'da arar
+                collection = ShardedCollection(chroma_client)
+            else:
+                collection = open_collection(chroma_client, COLLECTION_NAME)
             
             print(f"✅ ChromaDB başarıyla başlatıldı")
         except Exception as e:
@@ -84,60 +123,31 @@ def reset_database():
         global chroma_client, collection
         chroma_client = None
         collection = None
+        invalidate_corpus_stats()
+        reset_lexical_index()
+        reset_flat_index()
         
     except Exception as e:
         print(f"❌ Database sıfırlama hatası: {e}")
 
-def load_book_to_db(specialty: str, json_file_path: str) -> bool:
-    """Bir kitabın chunk'larını database'e yükle"""
+def load_book_to_db(specialty: str, json_file_path: str, batch_size: Optional[int] = None, resume: bool = True) -> bool:
+    """Bir kitabın chunk'larını database'e batch batch yükle (yarıda kalırsa devam eder)"""
     try:
-        # JSON dosyasını oku
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        
         # ChromaDB'yi başlat
         _, coll = initialize_chroma()
         if coll == "error":
             print(f"❌ ChromaDB hatası")
             return False
         
-        documents = []
-        metadatas = []
-        ids = []
-        
-        print(f"📚 {specialty} kitabı yükleniyor: {len(chunks)} chunk")
+        print(f"📚 {specialty} kitabı yükleniyor...")
+        stats = ingest_book(coll, specialty, json_file_path, batch_size=batch_size, resume=resume)
+        clear_mounted_manifest()
         
-        for i, chunk in enumerate(chunks):
-            # Unique ID oluştur
-            chunk_id = f"{specialty}_{i}"
-            
-            # Document content
-            content = chunk.get('content', chunk.get('text', ''))
-            if not content:
-                print(f"⚠️ Boş chunk atlanıyor: {chunk_id}")
-                continue
-                
-            documents.append(content)
-            
-            # Metadata oluştur
-            metadata = {
-                "specialty": specialty,
-                "book_title": chunk.get('book_title', f"{specialty.title()} Medical Book"),
-                "page_number": str(chunk.get('page_number', chunk.get('page', 'Unknown'))),
-                "chunk_index": i,
-                "source_type": "medical_textbook"
-            }
-            metadatas.append(metadata)
-            ids.append(chunk_id)
-        
-        # Batch olarak database'e ekle
-        if documents:
-            coll.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            print(f"✅ {specialty} başarıyla yüklendi: {len(documents)} chunk")
+        if stats["chunks"]:
+            record_book_loaded(coll, specialty, stats["chunks"])
+            print(f"✅ {specialty} başarıyla yüklendi: {stats['chunks']} chunk "
+                  f"({stats['chunks_per_second']} chunk/s, embed {stats['embed_seconds']}s, "
+                  f"yazma {stats['write_seconds']}s)")
             return True
         else:
             print(f"❌ {specialty} için hiç geçerli chunk bulunamadı")
@@ -147,21 +157,43 @@ def load_book_to_db(specialty: str, json_file_path: str) -> bool:
         print(f"❌ {specialty} yükleme hatası: {e}")
         return False
 
-def load_all_medical_books(books_config: Dict[str, str]) -> Dict[str, bool]:
-    """Tüm kitapları database'e yükle"""
+def load_all_medical_books(books_config: Dict[str, str], parallel: bool = False, workers: Optional[int] = None) -> Dict[str, bool]:
+    """Tüm kitapları database'e yükle (parallel=True ise embedding'ler çok çekirdekte hesaplanır)"""
     results = {}
     
     print("🚀 Tüm medical kitaplar yükleniyor...")
     print("=" * 50)
     
+    existing_books = {}
     for specialty, file_path in books_config.items():
         if os.path.exists(file_path):
-            success = load_book_to_db(specialty, file_path)
-            results[specialty] = success
+            existing_books[specialty] = file_path
         else:
             print(f"❌ Dosya bulunamadı: {file_path}")
             results[specialty] = False
     
+    if parallel and existing_books:
+        _, coll = initialize_chroma()
+        if coll == "error":
+            print(f"❌ ChromaDB hatası")
+            return {specialty: False for specialty in books_config}
+        try:
+            all_stats = ingest_books_parallel(coll, existing_books, workers=workers)
+            clear_mounted_manifest()
+            for specialty, stats in all_stats.items():
+                if stats["chunks"]:
+                    record_book_loaded(coll, specialty, stats["chunks"])
+                results[specialty] = stats["chunks"] > 0
+        except Exception as e:
+            print(f"❌ Paralel yükleme hatası: {e}")
+            for specialty in existing_books:
+                results[specialty] = False
+    else:
+        for specialty, file_path in existing_books.items():
+            results[specialty] = load_book_to_db(specialty, file_path)
+    
+    _refresh_flat_index()
+    
     print("=" * 50)
     print("📊 Yükleme Özeti:")
     for specialty, success in results.items():
@@ -170,56 +202,232 @@ def load_all_medical_books(books_config: Dict[str, str]) -> Dict[str, bool]:
     
     return results
 
-def query_db_by_specialty(query: str, specialty: str = None, n_results: int = 3) -> Dict:
-    """Specialty'ye göre filtrelenmiş sorgu"""
+def sync_book_to_db(specialty: str, json_file_path: str, batch_size: Optional[int] = None) -> bool:
+    """Kitabı artımlı güncelle: yalnızca yeni/değişen chunk'lar embed edilir"""
     try:
         _, coll = initialize_chroma()
         if coll == "error":
-            return {"documents": [], "metadatas": []}
+            print(f"❌ ChromaDB hatası")
+            return False
+        
+        stats = sync_book(coll, specialty, json_file_path, batch_size=batch_size)
+        if stats["added"] or stats["updated"] or stats["deleted"]:
+            clear_mounted_manifest()
+        record_book_loaded(coll, specialty, stats["chunks"])
+        print(f"✅ {specialty} güncellendi: {stats['added']} yeni, {stats['updated']} değişen, "
+              f"{stats['deleted']} silinen, {stats['unchanged']} aynı ({stats['seconds']}s)")
+        return stats["chunks"] > 0
+        
+    except Exception as e:
+        print(f"❌ {specialty} güncelleme hatası: {e}")
+        return False
+
+def sync_all_medical_books(books_config: Dict[str, str]) -> Dict[str, bool]:
+    """Tüm kitapları artımlı güncelle (reset_database gerekmez)"""
+    results = {}
+    print("🔄 Medical kitaplar artımlı güncelleniyor...")
+    for specialty, file_path in books_config.items():
+        if os.path.exists(file_path):
+            results[specialty] = sync_book_to_db(specialty, file_path)
+        else:
+            print(f"❌ Dosya bulunamadı: {file_path}")
+            results[specialty] = False
+    _refresh_flat_index()
+    return results
+
+def get_retrieval_collection():
+    """Sorguların gideceği koleksiyon: düz NumPy indeksi (RAG_VECTOR_BACKEND=flat) veya Chroma"""
+    if flat_backend_enabled():
+        index = get_flat_index()
+        if index is not None:
+            return index
+        print("⚠️ Düz vektör indeksi bulunamadı, Chroma kullanılıyor (python setup_database.py flat)")
+    _, coll = initialize_chroma()
+    return coll
+
+def build_flat_vector_index() -> Optional[Dict]:
+    """Chroma'daki chunk'ları ve embedding'leri memory-mapped düz indekse aktar"""
+    _, coll = initialize_chroma()
+    if coll == "error":
+        print(f"❌ ChromaDB hatası")
+        return None
+    manifest = build_flat_index(coll)
+    reset_flat_index()
+    clear_mounted_manifest()
+    return manifest
+
+def _refresh_flat_index():
+    # Düz indeks Chroma'dan türetilir; yükleme/güncellemeden sonra yeniden oluşturulur
+    if flat_backend_enabled():
+        try:
+            build_flat_vector_index()
+        except Exception as e:
+            print(f"⚠️ Düz vektör indeksi güncellenemedi: {e}")
+
+def reshard_collection(batch_size: int = 1000) -> Dict[str, int]:
+    """Tek koleksiyondaki chunk'ları embedding'leriyle birlikte specialty shard'larına kopyala"""
+    client, _ = initialize_chroma()
+    if client == "error":
+        print(f"❌ ChromaDB hatası")
+        return {}
+    source = client.get_or_create_collection(name=COLLECTION_NAME)
+    sharded = ShardedCollection(client)
+    copied = {}
+    offset = 0
+    print(f"🔀 {COLLECTION_NAME} shard'lara kopyalanıyor ({source.count()} chunk)...")
+    while True:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        if not page["ids"]:
+            break
+        # Yeniden embed edilmez; mevcut vektörler taşınır
+        sharded.upsert(ids=page["ids"], documents=page["documents"], metadatas=page["metadatas"],
+                       embeddings=page["embeddings"])
+        for metadata in page["metadatas"]:
+            copied[metadata["specialty"]] = copied.get(metadata["specialty"], 0) + 1
+        offset += len(page["ids"])
+    print(f"✅ Shard'lar hazır: {copied}")
+    print("ℹ️ Kullanmak için RAG_COLLECTION_LAYOUT=sharded ayarlayın")
+    return copied
+
+def create_snapshot(books_config: Dict[str, str], output_dir: Optional[str] = None) -> Optional[Dict]:
+    """Mevcut rag/db'den dağıtılabilir snapshot ve manifest oluştur"""
+    _, coll = initialize_chroma()
+    if coll == "error":
+        print(f"❌ ChromaDB hatası")
+        return None
+    counts = get_corpus_stats(coll, refresh=True)
+    if not counts:
+        print("❌ Database boş, snapshot oluşturulmadı")
+        return None
+    # BM25 indeksi de snapshot'a girsin
+    get_lexical_index(coll).save()
+    return build_snapshot(counts, books_config, output_dir)
+
+def _vector_query(coll, queries: List[str], where_filter: Optional[Dict], n_results: int) -> Dict:
+    # Embedding'ler önbellekten gelir; tüm sorgular tek Chroma çağrısında hazır vektörlerle gönderilir
+    query_embeddings = embed_queries(queries)
+    return coll.query(
+        query_embeddings=query_embeddings.tolist(),
+        n_results=n_results,
+        where=where_filter
+    )
+
+def _result_row(results: Dict, i: int) -> Dict:
+    """Çoklu sorgu sonucundan i. sorgunun sonucunu tek sorgu formatında al"""
+    return {
+        key: [results[key][i]]
+        for key in ("ids", "documents", "metadatas", "distances")
+        if results.get(key) is not None
+    }
+
+def _fuse_results(coll, vector_results: Dict, lexical_results: List, n_results: int) -> List[Dict]:
+    """Her sorgu için vektör ve BM25 sıralamalarını RRF ile birleştirip Chroma sonuç formatında döndür"""
+    found = {}
+    rows = []
+    for i, lexical_hits in enumerate(lexical_results):
+        vector_ids = vector_results["ids"][i]
+        distances = {}
+        for j, doc_id in enumerate(vector_ids):
+            found[doc_id] = (vector_results["documents"][i][j], vector_results["metadatas"][i][j])
+            if vector_results.get("distances"):
+                distances[doc_id] = vector_results["distances"][i][j]
+        fused = reciprocal_rank_fusion([vector_ids, [doc_id for doc_id, _ in lexical_hits]], k=RRF_K)[:n_results]
+        rows.append((fused, distances))
+
+    # Yalnızca BM25'in bulduğu chunk'ların içeriği Chroma'dan id ile (tek çağrıda) alınır
+    missing = list({doc_id for fused, _ in rows for doc_id in fused if doc_id not in found})
+    if missing:
+        extra = coll.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, document, metadata in zip(extra["ids"], extra["documents"], extra["metadatas"]):
+            found[doc_id] = (document, metadata)
+
+    results = []
+    for fused, distances in rows:
+        fused = [doc_id for doc_id in fused if doc_id in found]
+        results.append({
+            "ids": [fused],
+            "documents": [[found[doc_id][0] for doc_id in fused]],
+            "metadatas": [[found[doc_id][1] for doc_id in fused]],
+            "distances": [[distances.get(doc_id) for doc_id in fused]],
+        })
+    return results
+
+def query_db_batch(queries: List[str], specialty: str = None, n_results: int = 3) -> List[Dict]:
+    """Aynı specialty'deki birden çok sorguyu tek Chroma çağrısıyla sorgula (hibrit: vektör + BM25)"""
+    empty = {"documents": [], "metadatas": []}
+    if not queries:
+        return []
+    try:
+        # Chroma ve embedding modeli sidecar süreçteyse sorgular oraya gider
+        if sidecar_enabled():
+            return get_sidecar_client().query_batch(queries, specialty, n_results)
+        
+        coll = get_retrieval_collection()
+        if coll == "error":
+            return [dict(empty) for _ in queries]
         
         # Metadata filtreleme
         where_filter = None
         if specialty:
             where_filter = {"specialty": specialty}
         
-        results = coll.query(
-            query_texts=[query], 
-            n_results=n_results,
-            where=where_filter
-        )
+        lexical_index = get_lexical_index(coll) if HYBRID_SEARCH else None
+        if not lexical_index:
+            results = _vector_query(coll, queries, where_filter, n_results)
+            return [_result_row(results, i) for i in range(len(queries))]
         
-        return results
+        # Vektör araması thread'de, BM25 bu thread'de paralel çalışır
+        candidates = max(n_results, HYBRID_CANDIDATES)
+        vector_future = _search_executor.submit(_vector_query, coll, queries, where_filter, candidates)
+        lexical_results = [lexical_index.search(query, specialty, k=candidates) for query in queries]
+        vector_results = vector_future.result()
+        
+        return _fuse_results(coll, vector_results, lexical_results, n_results)
     except Exception as e:
         print(f"❌ Database sorgu hatası: {e}")
-        return {"documents": [], "metadatas": []}
+        return [dict(empty) for _ in queries]
+
+def query_db_by_specialty(query: str, specialty: str = None, n_results: int = 3) -> Dict:
+    """Specialty'ye göre filtrelenmiş sorgu (hibrit: vektör + BM25)"""
+    return query_db_batch([query], specialty, n_results)[0]
 
 def get_database_info() -> Dict:
     """Database bilgilerini getir"""
     try:
-        _, coll = initialize_chroma()
+        if sidecar_enabled():
+            return get_sidecar_client().database_info()
+        
+        coll = get_retrieval_collection()
         if coll == "error":
             return {"error": "ChromaDB kullanılamıyor"}
         
-        # Tüm metadataları al
-        results = coll.get()
+        # Düz indekste sayılar satır aralıklarından gelir; Chroma'da önbellekten
+        # (tam tarama yalnızca ilk seferde)
+        specialties = coll.chunk_counts() if hasattr(coll, "chunk_counts") else get_corpus_stats(coll)
         
-        if not results.get("metadatas"):
+        if not specialties:
             return {"total_chunks": 0, "specialties": []}
         
-        # Specialty'leri say
-        specialties = {}
-        for metadata in results["metadatas"]:
-            specialty = metadata.get("specialty", "unknown")
-            specialties[specialty] = specialties.get(specialty, 0) + 1
-        
         return {
-            "total_chunks": len(results["metadatas"]),
+            "total_chunks": sum(specialties.values()),
             "specialties": specialties,
             "available_books": list(specialties.keys())
         }
     except Exception as e:
         return {"error": f"Database bilgi alma hatası: {e}"}
 
+def is_book_available(specialty: str) -> bool:
+    """Specialty kitabının yüklü olup olmadığını O(1) kontrol et"""
+    if sidecar_enabled():
+        specialties = get_database_info().get("specialties") or {}
+        return specialties.get(specialty, 0) > 0
+    coll = get_retrieval_collection()
+    if coll == "error":
+        return False
+    if hasattr(coll, "chunk_counts"):
+        return coll.chunk_counts().get(specialty, 0) > 0
+    return get_corpus_stats(coll).get(specialty, 0) > 0
+
 def add_to_db(doc_id, content):
     """Eski API - geriye uyumluluk için"""
     print("⚠️ add_to_db deprecated. Use load_book_to_db instead.")
@@ -233,15 +441,52 @@ def query_db(query):
     return ""
 
 
-def ask_gemini_api(prompt: str, model_name: str = "models/gemini-1.5-flash-002", max_tokens=500, temperature=0.7) -> str:
+# Süreç boyunca paylaşılan Gemini modelleri: model adı -> GenerativeModel
+_gemini_models = {}
+_gemini_lock = threading.Lock()
+_configured_api_key = None
+gemini_pool_stats = {"hits": 0, "misses": 0}
+
+
+def get_gemini_model(model_name: str):
+    """genai'yi bir kez yapılandır ve model istemcisini tekrar kullan"""
+    global _configured_api_key
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("Gemini API anahtarı bulunamadı. Lütfen .env dosyasını kontrol edin.")
-    genai.configure(api_key=api_key)
-    
+
+    model = _gemini_models.get(model_name)
+    if model is not None and _configured_api_key == api_key:
+        gemini_pool_stats["hits"] += 1
+        return model
+
+    with _gemini_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+            _gemini_models.clear()
+        model = _gemini_models.get(model_name)
+        if model is None:
+            gemini_pool_stats["misses"] += 1
+            model = genai.GenerativeModel(model_name=model_name)
+            _gemini_models[model_name] = model
+        else:
+            gemini_pool_stats["hits"] += 1
+    return model
+
+
+def get_gemini_pool_info() -> Dict:
+    return {
+        "clients": len(_gemini_models),
+        "models": sorted(_gemini_models),
+        **gemini_pool_stats,
+    }
+
+
+def ask_gemini_api(prompt: str, model_name: str = "models/gemini-1.5-flash-002", max_tokens=500, temperature=0.7) -> str:
     try:
-        # Modeli başlat (örneğin gemini-pro kullanılıyor)
-        model = genai.GenerativeModel(model_name=model_name)
+        # Havuzdaki modeli kullan
+        model = get_gemini_model(model_name)
 
         try:
             response = model.generate_content(
@@ -274,62 +519,183 @@ def ask_gemini_api(prompt: str, model_name: str = "models/gemini-1.5-flash-002",
         # Diğer hatalar için genel exception
         raise
 
-def answer_question(question: str, specialty: str = None, model: str = "models/gemini-1.5-flash-002") -> Dict:
-    try:
-        if "[ENDOCRINOLOGY]" in question:
-            specialty = "endocrinology"
-            question = question.replace("[ENDOCRINOLOGY]", "").strip()
-        db_results = query_db_by_specialty(question, specialty, n_results=3)
-        if not db_results.get("documents") or not db_results["documents"][0]:
-            return {
-                "answer": "Üzgünüm, bu konuda bilgi bulamadım.",
-                "source_metadata": None,
-                "query_info": {
-                    "specialty_filter": specialty,
-                    "results_found": 0
-                }
-            }
-        context = db_results["documents"][0][0]
-        metadata = db_results["metadatas"][0][0] if db_results.get("metadatas") else {}
-        prompt = f"""
-Context: {context}
+def _parse_question(question: str, specialty: str = None):
+    if "[ENDOCRINOLOGY]" in question:
+        specialty = "endocrinology"
+        question = question.replace("[ENDOCRINOLOGY]", "").strip()
+    return question, specialty
+
+def _has_results(db_results: Dict) -> bool:
+    return bool(db_results.get("documents") and db_results["documents"][0])
+
+def _not_found_result(specialty: str = None) -> Dict:
+    return {
+        "answer": "Üzgünüm, bu konuda bilgi bulamadım.",
+        "source_metadata": None,
+        "query_info": {
+            "specialty_filter": specialty,
+            "results_found": 0
+        }
+    }
+
+def _build_prompt(question: str, db_results: Dict):
+    """Retrieval sonucundan bağlamı oluştur; (prompt, assembled) döndür"""
+    assembled = assemble_context(question, db_results)
+    prompt = f"""
+Context: {assembled["context"]}
 
 Question: {question}
 
 Answer based on the medical context provided:
 """
-        # Burada ask_gemini_api çağrısını try-except ile sarmalıyoruz:
+    return prompt, assembled
+
+def _build_result(question: str, specialty: str, model: str, db_results: Dict, assembled: Dict, llm_answer: str) -> Dict:
+    metadata = assembled["sources"][0] if assembled["sources"] else {}
+    book_title = metadata.get("book_title", "Unknown")
+    page_number = metadata.get("page_number", "Unknown")
+    answer_with_source = f"This information is from {book_title}'s {page_number}th page:\n\n{llm_answer}"
+    result = {
+        "answer": answer_with_source,
+        "source_metadata": {
+            "book_title": book_title,
+            "page_number": page_number,
+            "specialty": metadata.get("specialty", "Unknown")
+        },
+        "sources": assembled["sources"],
+        "query_info": {
+            "specialty_filter": specialty,
+            "results_found": len(db_results["documents"][0]),
+            "context_chunks": len(assembled["sources"]),
+            "context_tokens": assembled["tokens"]
+        }
+    }
+    store_answer(question, specialty, model, result)
+    return result
+
+def generate_answer(question: str, specialty: str, model: str, db_results: Dict) -> Dict:
+    """Hazır retrieval sonucundan cevabı üret (kota hatası ResourceExhausted olarak fırlar)"""
+    if not _has_results(db_results):
+        return _not_found_result(specialty)
+    prompt, assembled = _build_prompt(question, db_results)
+
+    # Burada ask_gemini_api çağrısını try-except ile sarmalıyoruz:
+    try:
+        llm_answer = ask_gemini_api(prompt, model_name=model, max_tokens=500, temperature=0.7)
+    except Exception as e:
+        print(f"❌ Inner exception in ask_gemini_api: {type(e).__name__} - {e}")
+        # Eğer bu zaten ResourceExhausted ise yeniden fırlat
+        if isinstance(e, ResourceExhausted):
+            raise e
+        # Eğer hata mesajı içinde 429 veya quota geçiyorsa yeniden sınıflandır
+        elif "429" in str(e) or "quota" in str(e).lower():
+            print("🚨 answer_question: ResourceExhausted olarak sınıflandırılıyor.")
+            raise ResourceExhausted(str(e))
+        # Diğer hataları direkt fırlat
+        raise e
+
+    return _build_result(question, specialty, model, db_results, assembled, llm_answer)
+
+def retrieve_batch(questions: List[str], specialty: str = None, model: str = "models/gemini-1.5-flash-002") -> List[Dict]:
+    """Soruları önbellekte ara; kalanlar için specialty başına tek Chroma sorgusu yap.
+    Her soru için {"question", "specialty", "cached"} ve gerekiyorsa "db_results" döner."""
+    items = []
+    for question in questions:
+        question, item_specialty = _parse_question(question, specialty)
+        items.append({
+            "question": question,
+            "specialty": item_specialty,
+            "cached": get_cached_answer(question, item_specialty, model),
+        })
+
+    groups = {}
+    for item in items:
+        if not item["cached"]:
+            groups.setdefault(item["specialty"], []).append(item)
+
+    for group_specialty, group in groups.items():
+        db_results = query_db_batch([item["question"] for item in group], group_specialty, n_results=CONTEXT_CANDIDATES)
+        for item, result in zip(group, db_results):
+            item["db_results"] = result
+    return items
+
+async def ask_gemini_api_async(prompt: str, model_name: str = "models/gemini-1.5-flash-002", max_tokens=500, temperature=0.7) -> str:
+    """ask_gemini_api'nin event loop'u bloklamayan sürümü (aynı kota sınıflandırması)"""
+    try:
+        model = get_gemini_model(model_name)
+        response = await model.generate_content_async(
+            prompt,
+            generation_config={
+                "temperature": temperature,
+                "max_output_tokens": max_tokens
+            }
+        )
         try:
-            llm_answer = ask_gemini_api(prompt, model_name=model, max_tokens=500, temperature=0.7)
+            return response.text.strip()
         except Exception as e:
-            print(f"❌ Inner exception in ask_gemini_api: {type(e).__name__} - {e}")
-            # Eğer bu zaten ResourceExhausted ise yeniden fırlat
-            if isinstance(e, ResourceExhausted):
-                raise e
-            # Eğer hata mesajı içinde 429 veya quota geçiyorsa yeniden sınıflandır
-            elif "429" in str(e) or "quota" in str(e).lower():
-                print("🚨 answer_question: ResourceExhausted olarak sınıflandırılıyor.")
-                raise ResourceExhausted(str(e))
-            # Diğer hataları direkt fırlat
-            raise e
+            print(f"❌ response.text içinde hata: {type(e).__name__} - {e}")
+            raise
 
-        
-        book_title = metadata.get("book_title", "Unknown")
-        page_number = metadata.get("page_number", "Unknown")
-        answer_with_source = f"This information is from {book_title}'s {page_number}th page:\n\n{llm_answer}"
+    except Exception as e:
+        # Eğer hata mesajında "429" veya kota aşımı ile ilgili bir şey varsa ResourceExhausted fırlat
+        if not isinstance(e, ResourceExhausted) and ("429" in str(e) or "quota" in str(e).lower()):
+            raise ResourceExhausted(str(e))
+        raise
+
+async def generate_answer_async(question: str, specialty: str, model: str, db_results: Dict) -> Dict:
+    """generate_answer'ın async sürümü; yalnızca Gemini çağrısı await edilir"""
+    if not _has_results(db_results):
+        return _not_found_result(specialty)
+    prompt, assembled = _build_prompt(question, db_results)
+
+    try:
+        llm_answer = await ask_gemini_api_async(prompt, model_name=model, max_tokens=500, temperature=0.7)
+    except ResourceExhausted:
+        raise
+    except Exception as e:
+        print(f"❌ Inner exception in ask_gemini_api_async: {type(e).__name__} - {e}")
+        raise
+
+    # Önbelleğe yazma senkron Redis kullanır, thread'de çalıştırılır
+    return await asyncio.to_thread(_build_result, question, specialty, model, db_results, assembled, llm_answer)
+
+async def answer_question_async(question: str, specialty: str = None, model: str = "models/gemini-1.5-flash-002") -> Dict:
+    """answer_question'ın async sürümü: Chroma ve Redis çağrıları thread'de, Gemini async API ile"""
+    try:
+        question, specialty = _parse_question(question, specialty)
+
+        cached = await asyncio.to_thread(get_cached_answer, question, specialty, model)
+        if cached:
+            return cached
+
+        db_results = await asyncio.to_thread(query_db_by_specialty, question, specialty, CONTEXT_CANDIDATES)
+        return await generate_answer_async(question, specialty, model, db_results)
+
+    except ResourceExhausted as e:
+        print(f"🟥 answer_question_async ResourceExhausted fırlatıyor: {e}")
+        raise
+
+    except Exception as e:
+        print(f"❌ answer_question_async dış hata: {type(e).__name__} - {e}")
         return {
-            "answer": answer_with_source,
-            "source_metadata": {
-                "book_title": book_title,
-                "page_number": page_number,
-                "specialty": metadata.get("specialty", "Unknown")
-            },
-            "query_info": {
-                "specialty_filter": specialty,
-                "results_found": len(db_results["documents"][0])
-            }
+            "answer": f"Bir hata oluştu: {str(e)}",
+            "source_metadata": None,
+            "query_info": None
         }
 
+def answer_question(question: str, specialty: str = None, model: str = "models/gemini-1.5-flash-002") -> Dict:
+    try:
+        question, specialty = _parse_question(question, specialty)
+
+        # Aynı soru daha önce cevaplandıysa Gemini'ye gitme
+        cached = get_cached_answer(question, specialty, model)
+        if cached:
+            return cached
+
+        # Daha fazla aday alınır; yeniden sıralama, tekrar eleme ve token bütçesi context.py'de
+        db_results = query_db_by_specialty(question, specialty, n_results=CONTEXT_CANDIDATES)
+        return generate_answer(question, specialty, model, db_results)
+
     except ResourceExhausted as e:
         print(f"🟥 answer_question ResourceExhausted fırlatıyor: {e}")
         raise
@@ -341,5 +707,3 @@ Answer based on the medical context provided:
             "source_metadata": None,
             "query_info": None
         }
-
-
@@ -0,0 +1,22 @@
+# redis_client.py
+import os
+
+import redis
+
+# Lazy loading için global değişken
+_redis_client = None
+
+
+def get_redis():
+    """RAG önbellekleri için paylaşılan Redis istemcisi (REDIS_URL yoksa None)"""
+    global _redis_client
+    if _redis_client is None:
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            return None
+        try:
+            _redis_client = redis.from_url(redis_url, decode_responses=True)
+        except Exception as e:
+            print(f"⚠️ RAG Redis bağlantısı kurulamadı: {e}")
+            return None
+    return _redis_client
@@ -0,0 +1,193 @@
+# shards.py
+"""
+Koleksiyon düzeni
+"single" düzende tüm kitaplar tek bir medical_books koleksiyonundadır ve
+specialty metadata filtresiyle sorgulanır. "sharded" düzende her specialty
+kendi koleksiyonunda (medical_books_{specialty}) durur: filtreli sorgu yalnızca
+o kitabın HNSW indeksinde arar, filtresiz sorgu tüm shard'lara dağıtılıp
+mesafeye göre birleştirilir. ShardedCollection, Chroma Collection'ın burada
+kullanılan kısmıyla (upsert/get/query/delete/count) aynı arayüzü sunar.
+HNSW parametreleri koleksiyon metadata'sıyla verilir; M ve construction_ef
+yalnızca koleksiyon oluşturulurken, search_ef her açılışta uygulanır.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+COLLECTION_NAME = "medical_books"
+COLLECTION_LAYOUT = os.getenv("RAG_COLLECTION_LAYOUT", "single")  # single | sharded
+
+HNSW_M = os.getenv("RAG_HNSW_M")
+HNSW_CONSTRUCTION_EF = os.getenv("RAG_HNSW_CONSTRUCTION_EF")
+HNSW_SEARCH_EF = os.getenv("RAG_HNSW_SEARCH_EF")
+
+_DEFAULT_GET_INCLUDE = ["metadatas", "documents"]
+_DEFAULT_QUERY_INCLUDE = ["metadatas", "documents", "distances"]
+
+
+def hnsw_metadata() -> Optional[Dict]:
+    """Ortam değişkenlerinden verilen HNSW parametreleri (hiçbiri yoksa None)"""
+    metadata = {}
+    if HNSW_M:
+        metadata["hnsw:M"] = int(HNSW_M)
+    if HNSW_CONSTRUCTION_EF:
+        metadata["hnsw:construction_ef"] = int(HNSW_CONSTRUCTION_EF)
+    if HNSW_SEARCH_EF:
+        metadata["hnsw:search_ef"] = int(HNSW_SEARCH_EF)
+    return metadata or None
+
+
+def open_collection(client, name: str):
+    """Koleksiyonu aç/oluştur; search_ef değiştiyse mevcut koleksiyona uygula"""
+    coll = client.get_or_create_collection(name=name, metadata=hnsw_metadata())
+    if HNSW_SEARCH_EF:
+        hnsw = (coll.configuration or {}).get("hnsw") or {}
+        if hnsw.get("ef_search") != int(HNSW_SEARCH_EF):
+            coll.modify(configuration={"hnsw": {"ef_search": int(HNSW_SEARCH_EF)}})
+    return coll
+
+
+def shard_name(specialty: str) -> str:
+    return f"{COLLECTION_NAME}_{specialty}"
+
+
+def specialty_of_id(chunk_id: str) -> str:
+    # Chunk id'leri {specialty}_{index}; specialty alt çizgi içerebilir
+    return chunk_id.rsplit("_", 1)[0]
+
+
+def _specialty_filter(where: Optional[Dict]) -> Optional[str]:
+    """Yalnızca specialty eşitliği olan filtrelerden shard'ı çıkar"""
+    if not where or set(where) != {"specialty"}:
+        return None
+    value = where["specialty"]
+    if isinstance(value, dict):
+        return value.get("$eq") if set(value) == {"$eq"} else None
+    return value
+
+
+class ShardedCollection:
+    """Specialty başına bir Chroma koleksiyonu; tek koleksiyon gibi kullanılır"""
+
+    def __init__(self, client, prefix: str = COLLECTION_NAME):
+        self.client = client
+        self.name = prefix
+        self._shards = {}
+        for coll in client.list_collections():
+            name = coll if isinstance(coll, str) else coll.name
+            if name.startswith(f"{prefix}_"):
+                self._shards[name[len(prefix) + 1:]] = open_collection(client, name)
+
+    def shards(self) -> Dict:
+        return dict(self._shards)
+
+    def _shard(self, specialty: str, create: bool = False):
+        shard = self._shards.get(specialty)
+        if shard is None and create:
+            shard = open_collection(self.client, shard_name(specialty))
+            self._shards[specialty] = shard
+        return shard
+
+    def _targets(self, where: Optional[Dict]):
+        """Filtre tek specialty'yi gösteriyorsa yalnızca o shard, yoksa hepsi"""
+        specialty = _specialty_filter(where)
+        if specialty is not None:
+            shard = self._shard(specialty)
+            # Shard'ın kendisi zaten tek specialty; filtreye gerek yok
+            return ([shard] if shard is not None else []), None
+        return [self._shards[name] for name in sorted(self._shards)], where
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self._shards.values())
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict], embeddings=None):
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(metadata["specialty"], []).append(i)
+        for specialty, indexes in groups.items():
+            self._shard(specialty, create=True).upsert(
+                ids=[ids[i] for i in indexes],
+                documents=[documents[i] for i in indexes],
+                metadatas=[metadatas[i] for i in indexes],
+                embeddings=[embeddings[i] for i in indexes] if embeddings is not None else None,
+            )
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        if ids is not None:
+            groups = {}
+            for chunk_id in ids:
+                groups.setdefault(specialty_of_id(chunk_id), []).append(chunk_id)
+            for specialty, shard_ids in groups.items():
+                shard = self._shard(specialty)
+                if shard is not None:
+                    shard.delete(ids=shard_ids)
+            return
+        shards, where = self._targets(where)
+        for shard in shards:
+            if where is None:
+                shard.delete(ids=shard.get(include=[])["ids"])
+            else:
+                shard.delete(where=where)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None, include=None,
+            limit: Optional[int] = None, offset: Optional[int] = None) -> Dict:
+        include = list(_DEFAULT_GET_INCLUDE if include is None else include)
+        result = {"ids": [], **{key: [] for key in include}}
+
+        if ids is not None:
+            groups = {}
+            for chunk_id in ids:
+                groups.setdefault(specialty_of_id(chunk_id), []).append(chunk_id)
+            parts = [(self._shard(specialty), {"ids": shard_ids}) for specialty, shard_ids in groups.items()]
+        else:
+            shards, where = self._targets(where)
+            parts = [(shard, {"where": where}) for shard in shards]
+
+        # limit/offset shard'lar sırayla birleştirilmiş gibi uygulanır
+        skip = offset or 0
+        remaining = limit
+        for shard, kwargs in parts:
+            if shard is None or (remaining is not None and remaining <= 0):
+                continue
+            if skip and kwargs.get("where") is None and ids is None:
+                size = shard.count()
+                if skip >= size:
+                    skip -= size
+                    continue
+            part = shard.get(include=include, limit=remaining, offset=skip or None, **kwargs)
+            skip = 0
+            result["ids"].extend(part["ids"])
+            for key in include:
+                if part.get(key) is not None:
+                    result[key].extend(part[key])
+            if remaining is not None:
+                remaining -= len(part["ids"])
+        return result
+
+    def query(self, query_embeddings=None, n_results: int = 10, where: Optional[Dict] = None,
+              include=None, **kwargs) -> Dict:
+        include = list(_DEFAULT_QUERY_INCLUDE if include is None else include)
+        shards, where = self._targets(where)
+        row_count = len(query_embeddings if query_embeddings is not None else kwargs.get("query_texts", []))
+        keys = ["ids", *include]
+        if "distances" not in keys:
+            keys.append("distances")
+        rows = [[] for _ in range(row_count)]
+
+        # Filtresiz sorguda her shard'dan top-k alınır ve mesafeye göre birleştirilir
+        for shard in shards:
+            size = shard.count()
+            if not size:
+                continue
+            part = shard.query(query_embeddings=query_embeddings, n_results=min(n_results, size),
+                               where=where, include=sorted(set(include) | {"distances"}), **kwargs)
+            for i in range(row_count):
+                for j in range(len(part["ids"][i])):
+                    rows[i].append({key: part[key][i][j] for key in keys if part.get(key) is not None})
+
+        result = {key: [] for key in keys}
+        for row in rows:
+            row = sorted(row, key=lambda hit: hit["distances"])[:n_results]
+            for key in keys:
+                result[key].append([hit.get(key) for hit in row])
+        return result
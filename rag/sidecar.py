@@ -0,0 +1,248 @@
+# sidecar.py
+"""
+Retrieval sidecar
+Çok worker'lı kurulumda Chroma istemcisi ve embedding modeli tek bir süreçte
+tutulur; API worker'ları bu sürece Unix socket üzerinden bağlanır.
+Aynı anda gelen sorgular kısa bir pencerede toplanıp specialty başına tek
+query_db_batch çağrısıyla cevaplanır. Böylece bellek worker sayısıyla çarpılmaz.
+
+Protokol: her satır bir JSON mesajı.
+  istek:  {"id": 1, "op": "query", "queries": [...], "specialty": "...", "n_results": 3}
+  cevap:  {"id": 1, "ok": true, "result": ...} veya {"id": 1, "ok": false, "error": "..."}
+
+Çalıştırma: RAG_SIDECAR_SOCKET=/tmp/rag.sock python -m rag.sidecar
+Worker'larda aynı ortam değişkeni verilince retrieval sidecar'a yönlenir.
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+from typing import Dict, List, Optional
+
+SIDECAR_SOCKET = os.getenv("RAG_SIDECAR_SOCKET")
+SIDECAR_TIMEOUT = float(os.getenv("RAG_SIDECAR_TIMEOUT", "30"))
+# Sunucu tarafında sorguların toplandığı pencere ve en büyük batch
+SIDECAR_BATCH_WINDOW_MS = float(os.getenv("RAG_SIDECAR_BATCH_WINDOW_MS", "5"))
+SIDECAR_MAX_BATCH = int(os.getenv("RAG_SIDECAR_MAX_BATCH", "64"))
+
+
+class SidecarError(RuntimeError):
+    pass
+
+
+def sidecar_enabled() -> bool:
+    return bool(SIDECAR_SOCKET)
+
+
+class SidecarClient:
+    """Senkron istemci; her thread kendi kalıcı bağlantısını kullanır"""
+
+    def __init__(self, socket_path: str, timeout: float = SIDECAR_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        self._local.stream = sock.makefile("rwb")
+        return self._local.stream
+
+    def _close(self):
+        for name in ("stream", "sock"):
+            conn = getattr(self._local, name, None)
+            if conn is not None:
+                try:
+                    conn.close()
+                except OSError:
+                    pass
+                setattr(self._local, name, None)
+
+    def call(self, op: str, **payload):
+        with self._id_lock:
+            self._next_id += 1
+            request_id = self._next_id
+        message = (json.dumps({"id": request_id, "op": op, **payload}) + "\n").encode("utf-8")
+
+        # Bağlantı kopmuşsa (sidecar yeniden başlatıldıysa) bir kez yeniden bağlan
+        for attempt in range(2):
+            stream = getattr(self._local, "stream", None) or self._connect()
+            try:
+                stream.write(message)
+                stream.flush()
+                line = stream.readline()
+                if not line:
+                    raise ConnectionError("Sidecar bağlantıyı kapattı")
+                break
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise SidecarError(response.get("error", "Bilinmeyen sidecar hatası"))
+        return response.get("result")
+
+    def query_batch(self, queries: List[str], specialty: Optional[str], n_results: int) -> List[Dict]:
+        return self.call("query", queries=queries, specialty=specialty, n_results=n_results)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.call("embed", texts=texts)
+
+    def database_info(self) -> Dict:
+        return self.call("info")
+
+    def ping(self) -> Dict:
+        return self.call("ping")
+
+
+# Lazy loading için global değişken
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sidecar_client() -> SidecarClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SidecarClient(SIDECAR_SOCKET)
+    return _client
+
+
+class RetrievalServer:
+    """Chroma ve embedding modelinin sahibi olan süreç"""
+
+    def __init__(self, socket_path: str, batch_window_ms: float = SIDECAR_BATCH_WINDOW_MS,
+                 max_batch: int = SIDECAR_MAX_BATCH):
+        self.socket_path = socket_path
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.queue: Optional[asyncio.Queue] = None
+        self.stats = {"requests": 0, "queries": 0, "chroma_calls": 0, "errors": 0}
+
+    async def _batcher(self):
+        """Kuyruktaki sorgu isteklerini toplayıp (specialty, n_results) başına tek çağrıda çalıştır"""
+        from .rag import query_db_batch
+
+        while True:
+            pending = [await self.queue.get()]
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.batch_window
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            groups = {}
+            for request, future in pending:
+                groups.setdefault((request.get("specialty"), request.get("n_results", 3)), []).append((request, future))
+
+            for (specialty, n_results), group in groups.items():
+                queries = [query for request, _ in group for query in request["queries"]]
+                try:
+                    results = await asyncio.to_thread(query_db_batch, queries, specialty, n_results)
+                    self.stats["chroma_calls"] += 1
+                    self.stats["queries"] += len(queries)
+                except Exception as e:
+                    for _, future in group:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                offset = 0
+                for request, future in group:
+                    count = len(request["queries"])
+                    if not future.done():
+                        future.set_result(results[offset:offset + count])
+                    offset += count
+
+    async def _dispatch(self, request: Dict):
+        from .embeddings import embed_texts
+        from .rag import get_database_info
+
+        op = request.get("op")
+        if op == "query":
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((request, future))
+            return await future
+        if op == "embed":
+            return (await asyncio.to_thread(embed_texts, request["texts"])).tolist()
+        if op == "info":
+            return await asyncio.to_thread(get_database_info)
+        if op == "ping":
+            return {"pid": os.getpid(), **self.stats}
+        raise ValueError(f"Bilinmeyen işlem: {op}")
+
+    async def _respond(self, request: Dict, writer, write_lock):
+        try:
+            response = {"id": request.get("id"), "ok": True, "result": await self._dispatch(request)}
+        except Exception as e:
+            self.stats["errors"] += 1
+            response = {"id": request.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"}
+        async with write_lock:
+            writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.stats["requests"] += 1
+                task = asyncio.create_task(self._respond(json.loads(line), writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self):
+        from .rag import ensure_database_ready, query_db_by_specialty
+
+        # Isınma: Chroma, embedding modeli ve BM25 indeksi istemciler bağlanmadan yüklenir
+        await asyncio.to_thread(ensure_database_ready)
+        await asyncio.to_thread(query_db_by_specialty, "warmup", None, 1)
+
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=64 * 1024 * 1024)
+        os.chmod(self.socket_path, 0o660)
+        print(f"🛰️ Retrieval sidecar dinliyor: {self.socket_path} (pid {os.getpid()})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def main():
+    global SIDECAR_SOCKET
+    socket_path = SIDECAR_SOCKET or "/tmp/rag_sidecar.sock"
+    # Sidecar'ın kendisi retrieval'ı yerelde yapar, kendine yönlenmez
+    # (python -m ile çalışınca bu modül __main__ olur; rag.sidecar ayrıca import edilir)
+    from . import sidecar as module
+    SIDECAR_SOCKET = module.SIDECAR_SOCKET = None
+    asyncio.run(RetrievalServer(socket_path).serve())
+
+
+if __name__ == "__main__":
+    main()
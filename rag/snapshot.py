@@ -0,0 +1,232 @@
+# snapshot.py
+"""
+Hazır vektör indeksi snapshot'ı
+Build adımında rag/db (Chroma + BM25 indeksi) sürümlü, checksum'lı bir tar.gz
+arşivine paketlenir ve yanına bir manifest yazılır (kitaplar, chunk sayıları,
+embedding modeli, dosya checksum'ları). Açılışta yalnızca manifest okunur:
+yerleşik snapshot'ın sürümü ve embedding modeli tutuyorsa koleksiyon taranmaz,
+hiçbir şey yeniden embed edilmez. Tutmuyorsa arşiv doğrulanıp rag/db'ye açılır.
+Birden çok worker aynı anda açılırsa yalnızca biri arşivi açar (dosya kilidi);
+bu işlem Chroma rag/db üzerinde açılmadan önce yapılmalıdır.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: kilit yok, tek süreçli geliştirme ortamı varsayılır
+    fcntl = None
+
+from .embeddings import EMBEDDING_MODEL_ID
+from .shards import COLLECTION_NAME, COLLECTION_LAYOUT
+
+SNAPSHOT_FORMAT = 1
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db")
+SNAPSHOT_DIR = os.getenv(
+    "RAG_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots"),
+)
+# rag/db içindeki (yerleşik snapshot'ın) manifest'i
+MANIFEST_NAME = "snapshot_manifest.json"
+# Snapshot klasöründeki (dağıtılan arşivin) manifest'i
+SHIPPED_MANIFEST_NAME = "manifest.json"
+# Snapshot'a girmeyen dosya/klasörler
+_EXCLUDED = {"ingest_checkpoints", MANIFEST_NAME}
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _db_files(db_path: str):
+    """Snapshot'a girecek dosyaların db_path'e göre göreli yolları"""
+    for root, dirs, files in os.walk(db_path):
+        dirs[:] = sorted(d for d in dirs if d not in _EXCLUDED)
+        for name in sorted(files):
+            rel_path = os.path.relpath(os.path.join(root, name), db_path)
+            if rel_path in _EXCLUDED or name.endswith(".tmp"):
+                continue
+            yield rel_path
+
+
+def build_snapshot(chunk_counts: Dict[str, int], books_config: Dict[str, str],
+                   output_dir: Optional[str] = None, db_path: Optional[str] = None) -> Dict:
+    """rag/db'yi sürümlü arşive paketle ve manifest'leri yaz"""
+    output_dir = output_dir or SNAPSHOT_DIR
+    db_path = db_path or DB_PATH
+    os.makedirs(output_dir, exist_ok=True)
+
+    books = {}
+    for specialty, file_path in books_config.items():
+        books[specialty] = {
+            "file": os.path.basename(file_path),
+            "sha256": _sha256_file(file_path) if os.path.exists(file_path) else None,
+            "chunks": chunk_counts.get(specialty, 0),
+        }
+
+    files = {
+        rel_path: {
+            "size": os.path.getsize(os.path.join(db_path, rel_path)),
+            "sha256": _sha256_file(os.path.join(db_path, rel_path)),
+        }
+        for rel_path in _db_files(db_path)
+    }
+
+    content_digest = hashlib.sha256(
+        json.dumps([EMBEDDING_MODEL_ID, books, files], sort_keys=True).encode("utf-8")
+    ).hexdigest()[:12]
+    version = f"{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{content_digest}"
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "created_at": time.time(),
+        "embedding_model": EMBEDDING_MODEL_ID,
+        "collection": COLLECTION_NAME,
+        "layout": COLLECTION_LAYOUT,
+        "total_chunks": sum(chunk_counts.values()),
+        "chunk_counts": chunk_counts,
+        "books": books,
+        "files": files,
+    }
+
+    # Manifest arşivin içinde de bulunur; açılınca rag/db'de yerleşik manifest olur
+    _write_json(os.path.join(db_path, MANIFEST_NAME), manifest)
+    archive_name = f"medical_db-{version}.tar.gz"
+    archive_path = os.path.join(output_dir, archive_name)
+    with tarfile.open(archive_path, "w:gz") as tar:
+        for rel_path in files:
+            tar.add(os.path.join(db_path, rel_path), arcname=rel_path)
+        tar.add(os.path.join(db_path, MANIFEST_NAME), arcname=MANIFEST_NAME)
+
+    shipped = {**manifest, "archive": archive_name, "archive_sha256": _sha256_file(archive_path)}
+    _write_json(os.path.join(output_dir, SHIPPED_MANIFEST_NAME), shipped)
+    print(f"📦 Snapshot oluşturuldu: {archive_path} ({manifest['total_chunks']} chunk, {len(files)} dosya)")
+    return shipped
+
+
+def read_mounted_manifest(db_path: Optional[str] = None, expected_version: Optional[str] = None) -> Optional[Dict]:
+    """Yerleşik snapshot'ı sabit sürede doğrula: format, embedding modeli, sürüm ve dosyaların varlığı"""
+    db_path = db_path or DB_PATH
+    manifest = _read_json(os.path.join(db_path, MANIFEST_NAME))
+    if not manifest or manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if manifest.get("embedding_model") != EMBEDDING_MODEL_ID:
+        print(f"⚠️ Snapshot embedding modeli farklı: {manifest.get('embedding_model')}")
+        return None
+    if manifest.get("layout", "single") != COLLECTION_LAYOUT:
+        print(f"⚠️ Snapshot koleksiyon düzeni farklı: {manifest.get('layout', 'single')}")
+        return None
+    if expected_version and manifest.get("version") != expected_version:
+        return None
+    # Chroma dosyaları çalışırken değişebildiği için burada yalnızca varlık kontrol edilir;
+    # içerik checksum'ları arşiv açılırken doğrulanır
+    if not all(os.path.exists(os.path.join(db_path, rel_path)) for rel_path in manifest.get("files", {})):
+        return None
+    return manifest
+
+
+def clear_mounted_manifest(db_path: Optional[str] = None):
+    """rag/db snapshot dışında değiştirildiğinde yerleşik manifest geçersiz olur"""
+    db_path = db_path or DB_PATH
+    path = os.path.join(db_path, MANIFEST_NAME)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _extract_archive(shipped: Dict, snapshot_dir: str, db_path: str):
+    archive_path = os.path.join(snapshot_dir, shipped["archive"])
+    if _sha256_file(archive_path) != shipped["archive_sha256"]:
+        raise ValueError(f"Snapshot arşivinin checksum'ı tutmuyor: {archive_path}")
+
+    incoming = f"{db_path}.incoming"
+    shutil.rmtree(incoming, ignore_errors=True)
+    with tarfile.open(archive_path, "r:gz") as tar:
+        tar.extractall(incoming, filter="data")
+
+    for rel_path, info in shipped["files"].items():
+        if _sha256_file(os.path.join(incoming, rel_path)) != info["sha256"]:
+            shutil.rmtree(incoming, ignore_errors=True)
+            raise ValueError(f"Snapshot dosyasının checksum'ı tutmuyor: {rel_path}")
+
+    # Yeni db hazır olduktan sonra eskisiyle yer değiştir
+    previous = f"{db_path}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(db_path):
+        os.replace(db_path, previous)
+    os.replace(incoming, db_path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+@contextmanager
+def _mount_lock(db_path: str):
+    """rag/db'nin yanındaki kilit dosyası; aynı anda yalnızca bir süreç snapshot açar"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    with open(f"{db_path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def mount_snapshot(snapshot_dir: Optional[str] = None, db_path: Optional[str] = None) -> Optional[Dict]:
+    """Dağıtılan snapshot'ı kullanıma al; yerleşik sürüm güncelse hiçbir şey yapma"""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    db_path = db_path or DB_PATH
+    shipped = _read_json(os.path.join(snapshot_dir, SHIPPED_MANIFEST_NAME))
+    expected_version = shipped.get("version") if shipped else None
+
+    manifest = read_mounted_manifest(db_path, expected_version)
+    if manifest or not shipped:
+        return manifest
+
+    if (shipped.get("format") != SNAPSHOT_FORMAT or shipped.get("embedding_model") != EMBEDDING_MODEL_ID
+            or shipped.get("layout", "single") != COLLECTION_LAYOUT):
+        print("⚠️ Dağıtılan snapshot bu sürümle uyumsuz, kullanılmıyor")
+        return None
+
+    with _mount_lock(db_path):
+        # Kilidi beklerken başka bir worker snapshot'ı açmış olabilir
+        manifest = read_mounted_manifest(db_path, expected_version)
+        if manifest:
+            return manifest
+
+        print(f"📦 Snapshot açılıyor: {shipped['archive']}")
+        started = time.perf_counter()
+        try:
+            _extract_archive(shipped, snapshot_dir, db_path)
+        except Exception as e:
+            print(f"❌ Snapshot açılamadı: {e}")
+            return None
+        print(f"✅ Snapshot açıldı ({time.perf_counter() - started:.1f}s)")
+        return read_mounted_manifest(db_path, expected_version)
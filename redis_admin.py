@@ -0,0 +1,59 @@
+"""
+Redis inceleme araçları
+KEYS yerine SCAN kullanılır; her sayfa için tipler ve özetler pipeline ile okunur.
+Listeler, hash'ler ve kümeler için tüm içerik yerine yalnızca boyut döner.
+Böylece maliyet keyspace'e değil sayfa boyutuna bağlı kalır ve Redis bloklanmaz.
+"""
+
+MAX_PAGE_SIZE = 1000
+
+# Tip -> boyut komutu
+_SIZE_COMMANDS = {
+    "list": "llen",
+    "hash": "hlen",
+    "set": "scard",
+    "zset": "zcard",
+    "stream": "xlen",
+}
+
+
+async def scan_keys_page(client, cursor: int = 0, count: int = 100, match: str = "*", preview: int = 200) -> dict:
+    """Bir SCAN sayfasını tip, TTL ve boyut/önizleme bilgisiyle döndür"""
+    count = max(1, min(count, MAX_PAGE_SIZE))
+    next_cursor, keys = await client.scan(cursor=cursor, match=match, count=count)
+
+    async with client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.type(key)
+            pipe.ttl(key)
+        meta = await pipe.execute()
+    types = meta[0::2]
+    ttls = meta[1::2]
+
+    async with client.pipeline(transaction=False) as pipe:
+        for key, key_type in zip(keys, types):
+            if key_type == "string":
+                pipe.strlen(key)
+                if preview > 0:
+                    pipe.getrange(key, 0, preview - 1)
+            elif key_type in _SIZE_COMMANDS:
+                getattr(pipe, _SIZE_COMMANDS[key_type])(key)
+        values = iter(await pipe.execute())
+
+    result = {}
+    for key, key_type, ttl in zip(keys, types, ttls):
+        info = {"type": key_type, "ttl": ttl}
+        if key_type == "string":
+            info["size"] = next(values)
+            info["value"] = next(values) if preview > 0 else None
+            info["truncated"] = preview > 0 and info["size"] > preview
+        elif key_type in _SIZE_COMMANDS:
+            info["size"] = next(values)
+        result[key] = info
+
+    return {
+        "cursor": int(next_cursor),
+        "done": int(next_cursor) == 0,
+        "count": len(result),
+        "redis_keys": result,
+    }
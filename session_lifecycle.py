@@ -0,0 +1,142 @@
+"""
+Oturum yaşam döngüsü
+Arka planda çalışan süpürücü, TTL'i olmayan oturum anahtarlarına (eski sürümlerden
+kalan veya yarım yazılmış) süre atar, sahipsiz geçmiş listelerini siler ve
+oturum başına anahtar/bayt metriklerini hesaplar. Tahmini toplam boyut
+ayarlanan bellek bütçesini aşarsa uyarı verir.
+Böylece Redis boyutu aktif oturum sayısıyla orantılı kalır.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from session_store import SESSION_TTL_SECONDS, history_key, summary_lock_key
+
+SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "300"))
+SWEEP_LOCK_KEY = "sessions:sweeper_lock"
+METRICS_KEY = "sessions:metrics"
+# MEMORY USAGE her anahtar için çağrılmaz, bu kadar oturumdan örneklenir
+MEMORY_SAMPLE_SIZE = int(os.getenv("SESSION_MEMORY_SAMPLE_SIZE", "200"))
+# Oturumların toplam Redis bellek bütçesi (bayt, 0 = kapalı); aşılırsa uyarı verilir
+SESSION_MEMORY_BUDGET_BYTES = int(os.getenv("SESSION_MEMORY_BUDGET_BYTES", "0"))
+
+session_metrics = {
+    "active_sessions": 0,
+    "session_keys": 0,
+    "keys_without_ttl": 0,
+    "orphans_removed": 0,
+    "avg_bytes_per_session": None,
+    "estimated_total_bytes": None,
+    "memory_budget_bytes": SESSION_MEMORY_BUDGET_BYTES or None,
+    "over_budget": False,
+    "last_sweep": None,
+    "sweep_duration_ms": None,
+}
+
+
+def _session_id_of(key: str) -> str:
+    # session:{id} veya session:{id}:{alan}
+    return key.split(":", 2)[1]
+
+
+async def sweep_sessions(client, batch_size: int = 500) -> dict:
+    """Tüm oturum anahtarlarını SCAN ile bir kez dolaş ve metrikleri güncelle"""
+    started = time.perf_counter()
+    sessions = {}
+    keys_without_ttl = 0
+    orphans_removed = 0
+    active = []
+
+    async for key in client.scan_iter(match="session:*", count=batch_size):
+        sessions.setdefault(_session_id_of(key), []).append(key)
+
+    session_ids = list(sessions)
+    for i in range(0, len(session_ids), batch_size):
+        batch = session_ids[i:i + batch_size]
+        async with client.pipeline(transaction=False) as pipe:
+            for session_id in batch:
+                for key in sessions[session_id]:
+                    pipe.ttl(key)
+            ttls = iter(await pipe.execute())
+
+        async with client.pipeline(transaction=False) as pipe:
+            for session_id in batch:
+                keys = sessions[session_id]
+                # Geçmiş listesi ve özet kilidi dışında bir anahtar varsa oturum yaşıyor
+                has_state = any(k not in (history_key(session_id), summary_lock_key(session_id)) for k in keys)
+                if has_state:
+                    active.append(session_id)
+                for key in keys:
+                    ttl = next(ttls)
+                    if not has_state:
+                        # Durumu olmayan geçmiş listesi artık kullanılamaz
+                        pipe.delete(key)
+                        orphans_removed += 1
+                    elif ttl == -1:
+                        pipe.expire(key, SESSION_TTL_SECONDS)
+                        keys_without_ttl += 1
+            await pipe.execute()
+
+    avg_bytes = await _sample_session_bytes(client, active, sessions)
+    estimated_total = int(avg_bytes * len(active)) if avg_bytes is not None else None
+    over_budget = bool(SESSION_MEMORY_BUDGET_BYTES and estimated_total
+                       and estimated_total > SESSION_MEMORY_BUDGET_BYTES)
+    if over_budget:
+        print(f"⚠️ Oturumlar bellek bütçesini aşıyor: ~{estimated_total} bayt "
+              f"(bütçe {SESSION_MEMORY_BUDGET_BYTES}, {len(active)} aktif oturum)")
+
+    session_metrics.update({
+        "active_sessions": len(active),
+        "session_keys": sum(len(sessions[sid]) for sid in active),
+        "keys_without_ttl": keys_without_ttl,
+        "orphans_removed": orphans_removed,
+        "avg_bytes_per_session": avg_bytes,
+        "estimated_total_bytes": estimated_total,
+        "memory_budget_bytes": SESSION_MEMORY_BUDGET_BYTES or None,
+        "over_budget": over_budget,
+        "last_sweep": time.time(),
+        "sweep_duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
+    # Diğer worker'lar da son metrikleri okuyabilsin
+    await client.set(METRICS_KEY, json.dumps(session_metrics))
+    return session_metrics
+
+
+async def get_session_metrics(client) -> dict:
+    """Son süpürmenin metriklerini döndür (hangi worker yaptıysa)"""
+    data = await client.get(METRICS_KEY)
+    return json.loads(data) if data else dict(session_metrics)
+
+
+async def _sample_session_bytes(client, session_ids, sessions):
+    """Örneklenen oturumların MEMORY USAGE ortalaması (bayt)"""
+    sample = session_ids[:MEMORY_SAMPLE_SIZE]
+    if not sample:
+        return 0
+    try:
+        async with client.pipeline(transaction=False) as pipe:
+            for session_id in sample:
+                for key in sessions[session_id]:
+                    pipe.memory_usage(key)
+            usages = await pipe.execute()
+    except Exception as e:
+        print(f"⚠️ MEMORY USAGE alınamadı: {e}")
+        return None
+    return round(sum(u or 0 for u in usages) / len(sample), 1)
+
+
+async def run_sweeper(client, interval: int = SWEEP_INTERVAL_SECONDS):
+    """Süpürücüyü periyodik çalıştır; birden çok worker varsa yalnızca biri süpürür"""
+    while True:
+        try:
+            if await client.set(SWEEP_LOCK_KEY, 1, nx=True, ex=max(interval - 1, 1)):
+                metrics = await sweep_sessions(client)
+                print(f"🧹 Oturum süpürme: {metrics['active_sessions']} aktif oturum, "
+                      f"{metrics['orphans_removed']} sahipsiz anahtar silindi")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Oturum süpürme hatası: {e}")
+        await asyncio.sleep(interval)
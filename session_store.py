@@ -0,0 +1,129 @@
+"""
+Oturum deposu
+Her oturumun durumu tek bir Redis hash'inde (session:{id}:state) tutulur.
+Yazmalar pipeline ile, okumalar HMGET ile yalnızca gereken alanlar için yapılır.
+Sohbet geçmişi ayrı bir liste anahtarında (session:{id}) kalır.
+Her erişim oturum anahtarlarının TTL'ini yeniler (sliding expiry).
+"""
+
+import json
+import os
+
+# Oturum bu kadar süre hareketsiz kalırsa Redis'ten silinir
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "7200"))
+
+# Eski sürümün her alan için ayrı string anahtarları (session:{id}:{alan})
+LEGACY_FIELDS = ("prompt", "model_index", "patient", "doctor_gender", "diagnosis", "summary", "summary_upto")
+
+
+def history_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+def state_key(session_id: str) -> str:
+    return f"session:{session_id}:state"
+
+
+def summary_lock_key(session_id: str) -> str:
+    return f"session:{session_id}:summary_lock"
+
+
+def legacy_keys(session_id: str):
+    return [f"session:{session_id}:{field}" for field in LEGACY_FIELDS]
+
+
+def session_keys(session_id: str):
+    """Bir oturuma ait tüm Redis anahtarları"""
+    return [history_key(session_id), state_key(session_id), summary_lock_key(session_id), *legacy_keys(session_id)]
+
+
+def _refresh_ttl(pipe, session_id: str):
+    pipe.expire(state_key(session_id), SESSION_TTL_SECONDS)
+    pipe.expire(history_key(session_id), SESSION_TTL_SECONDS)
+
+
+async def create_session(client, session_id: str, **fields):
+    """Yeni oturumun tüm alanlarını tek round-trip'te yaz"""
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.delete(state_key(session_id))
+        pipe.hset(state_key(session_id), mapping=fields)
+        _refresh_ttl(pipe, session_id)
+        await pipe.execute()
+
+
+async def set_session_fields(client, session_id: str, **fields):
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hset(state_key(session_id), mapping=fields)
+        _refresh_ttl(pipe, session_id)
+        await pipe.execute()
+
+
+async def append_turn(client, session_id: str, user_message: str, bot_response: str):
+    """Tamamlanan sohbet turunu geçmişe ekle"""
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.rpush(history_key(session_id), json.dumps({"user": user_message, "bot": bot_response}))
+        _refresh_ttl(pipe, session_id)
+        await pipe.execute()
+
+
+async def close_session(client, session_id: str) -> int:
+    """Oturumu kapat ve ona ait tüm anahtarları sil"""
+    return await client.delete(*session_keys(session_id))
+
+
+async def get_session_fields(client, session_id: str, *fields) -> dict:
+    """İstenen alanları HMGET ile oku; eski formattaki oturumları yerinde dönüştür"""
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hmget(state_key(session_id), fields)
+        _refresh_ttl(pipe, session_id)
+        values = (await pipe.execute())[0]
+    if all(v is None for v in values) and await migrate_legacy_session(client, session_id):
+        values = await client.hmget(state_key(session_id), fields)
+    return dict(zip(fields, values))
+
+
+async def get_patient(client, session_id: str):
+    """Oturumdaki hasta verisini döndür (yoksa None)"""
+    patient_json = (await get_session_fields(client, session_id, "patient"))["patient"]
+    return json.loads(patient_json) if patient_json else None
+
+
+async def load_chat_state(client, session_id: str, fields, history_start: int = 0, history_end: int = -1):
+    """Sohbet turu için hash alanlarını, geçmiş uzunluğunu ve geçmiş penceresini tek round-trip'te oku"""
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.hmget(state_key(session_id), fields)
+        pipe.llen(history_key(session_id))
+        pipe.lrange(history_key(session_id), history_start, history_end)
+        _refresh_ttl(pipe, session_id)
+        values, length, messages, *_ = await pipe.execute()
+
+    if all(v is None for v in values) and await migrate_legacy_session(client, session_id):
+        values = await client.hmget(state_key(session_id), fields)
+    return dict(zip(fields, values)), length, messages
+
+
+async def migrate_legacy_session(client, session_id: str) -> bool:
+    """Ayrı string anahtarlarda tutulan eski oturumu hash'e taşı"""
+    keys = legacy_keys(session_id)
+    values = await client.mget(keys)
+    fields = {field: value for field, value in zip(LEGACY_FIELDS, values) if value is not None}
+    if not fields:
+        return False
+
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.hset(state_key(session_id), mapping=fields)
+        pipe.delete(*keys)
+        _refresh_ttl(pipe, session_id)
+        await pipe.execute()
+    print(f"🔁 Eski oturum hash formatına taşındı: {session_id}")
+    return True
+
+
+async def migrate_all_legacy_sessions(client, batch_size: int = 500) -> int:
+    """Redis'teki tüm eski formattaki oturumları SCAN ile bulup taşı"""
+    migrated = 0
+    async for key in client.scan_iter(match="session:*:prompt", count=batch_size):
+        session_id = key[len("session:"):-len(":prompt")]
+        if await migrate_legacy_session(client, session_id):
+            migrated += 1
+    return migrated
@@ -7,7 +7,15 @@ Production uygulamasında otomatik çalışır.
 
 import os
 import sys
-from rag.rag import get_database_info, load_all_medical_books, reset_database
+from rag.rag import (
+    get_database_info,
+    load_all_medical_books,
+    reset_database,
+    sync_all_medical_books,
+    create_snapshot,
+    reshard_collection,
+    build_flat_vector_index,
+)
 
 def get_books_config():
     """Kitap konfigürasyonunu döndür"""
@@ -36,6 +44,9 @@ def check_books_available():
     for specialty, file_path in books_config.items():
         if os.path.exists(file_path):
             available_books[specialty] = file_path
+        elif os.path.exists(f"{file_path}l"):
+            # JSON Lines formatı (*_chunks.jsonl)
+            available_books[specialty] = f"{file_path}l"
     
     return available_books
 
@@ -58,9 +69,8 @@ def setup_database_if_needed():
     
     print(f"📚 {len(available_books)} kitap bulundu, database kuruluyor...")
     
-    # Database'i kur
-    reset_database()
-    results = load_all_medical_books(available_books)
+    # Database'i artımlı kur (silip baştan yüklemek yerine)
+    results = sync_all_medical_books(available_books)
     
     # Sonuçları kontrol et
     successful_books = sum(1 for success in results.values() if success)
@@ -177,8 +187,60 @@ def check_database():
     for specialty, count in info.get('specialties', {}).items():
         print(f"  - {specialty}: {count} chunk")
 
+def sync_database():
+    """Değişen kitapları artımlı güncelle (yalnızca yeni/değişen chunk'lar embed edilir)"""
+    print("🔄 Database Artımlı Güncelleme")
+    print("=" * 30)
+    
+    available_books = check_books_available()
+    if not available_books:
+        print("❌ books_data/ klasöründe kitap bulunamadı")
+        return False
+    
+    results = sync_all_medical_books(available_books)
+    successful_books = sum(1 for success in results.values() if success)
+    print(f"✅ {successful_books}/{len(results)} kitap güncel")
+    return successful_books > 0
+
+def rebuild_database():
+    """Database'i sıfırdan, tüm çekirdekleri kullanarak kur"""
+    print("🏗️ Database Paralel Yeniden Kurulum")
+    print("=" * 30)
+    
+    available_books = check_books_available()
+    if not available_books:
+        print("❌ books_data/ klasöründe kitap bulunamadı")
+        return False
+    
+    reset_database()
+    results = load_all_medical_books(available_books, parallel=True)
+    return any(results.values())
+
+def snapshot_database(output_dir=None):
+    """Build adımı: database'i güncelle ve dağıtılacak snapshot'ı oluştur"""
+    print("📦 Database Snapshot")
+    print("=" * 30)
+    
+    available_books = check_books_available()
+    if not available_books:
+        print("❌ books_data/ klasöründe kitap bulunamadı")
+        return False
+    
+    sync_all_medical_books(available_books)
+    return create_snapshot(available_books, output_dir) is not None
+
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "check":
         check_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == "sync":
+        sync_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == "flat":
+        build_flat_vector_index()
+    elif len(sys.argv) > 1 and sys.argv[1] == "reshard":
+        reshard_collection()
+    elif len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+        snapshot_database(sys.argv[2] if len(sys.argv) > 2 else None)
     else:
         main()
@@ -0,0 +1,100 @@
+"""
+Açılış ısınması
+Uygulama açılır açılmaz isteklere cevap verebilir (liveness); ağır hazırlık
+arka planda yapılır: Chroma açılır, embedding modeli yüklenir, sahte bir sorgu
+çalıştırılır ve LLM istemcileri önceden oluşturulur. Readiness yalnızca sıcak
+yol hazır olduğunda olumlu döner, böylece ilk öğrenci isteği soğuk başlangıcı ödemez.
+Zorunlu bir adım geçici olarak başarısız olursa (ör. sidecar henüz açılmadı)
+artan bekleme süreleriyle, süre sınırına kadar yeniden denenir.
+"""
+
+import asyncio
+import os
+import time
+
+from patient_agent import get_llm, GEMINI_MODELS
+from rag.embeddings import embed_texts
+from rag.rag import ensure_database_ready, query_db_by_specialty, get_gemini_model
+from rag.sidecar import sidecar_enabled, get_sidecar_client
+
+# Zorunlu adımlar bu süre dolana kadar yeniden denenir (saniye)
+WARMUP_DEADLINE_SECONDS = float(os.getenv("WARMUP_DEADLINE_SECONDS", "300"))
+WARMUP_RETRY_INITIAL_SECONDS = float(os.getenv("WARMUP_RETRY_INITIAL_SECONDS", "1"))
+WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", "30"))
+
+warmup_state = {
+    "status": "pending",  # pending | warming | ready | failed
+    "steps": {},
+    "started_at": None,
+    "finished_at": None,
+}
+
+
+def _run_step(name, fn, required=True) -> bool:
+    started = time.perf_counter()
+    try:
+        result = fn()
+        ok = result is not False
+        error = None if ok else "başarısız"
+    except Exception as e:
+        ok, error = False, str(e)
+    warmup_state["steps"][name] = {
+        "ok": ok,
+        "required": required,
+        "attempts": warmup_state["steps"].get(name, {}).get("attempts", 0) + 1,
+        "seconds": round(time.perf_counter() - started, 3),
+        "error": error,
+    }
+    icon = "✅" if ok else ("❌" if required else "⚠️")
+    print(f"{icon} Isınma adımı {name}: {warmup_state['steps'][name]['seconds']}s" + (f" ({error})" if error else ""))
+    return ok or not required
+
+
+def _warm_llm_clients():
+    for model_name in GEMINI_MODELS:
+        get_llm(model_name)
+        get_gemini_model(model_name)
+
+
+def _run_step_with_retry(name, fn, deadline) -> bool:
+    """Zorunlu adımı başarılı olana veya süre sınırı dolana kadar artan aralıklarla dene"""
+    delay = WARMUP_RETRY_INITIAL_SECONDS
+    while not _run_step(name, fn):
+        if time.monotonic() + delay > deadline:
+            return False
+        print(f"🔁 Isınma adımı {name} {delay:.0f}s sonra tekrar denenecek")
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+    return True
+
+
+def _warm_retrieval() -> bool:
+    """Bloklayan retrieval adımları (thread'de çalışır)"""
+    deadline = time.monotonic() + WARMUP_DEADLINE_SECONDS
+    return (
+        _run_step_with_retry("database", ensure_database_ready, deadline)
+        # Sidecar modunda model sidecar'da yüklüdür; yalnızca bağlantı denenir
+        and _run_step_with_retry("embedding_model", lambda: get_sidecar_client().ping() if sidecar_enabled() else embed_texts(["warmup"]), deadline)
+        and _run_step_with_retry("dummy_query", lambda: query_db_by_specialty("warmup", None, n_results=1), deadline)
+    )
+
+
+async def run_warmup() -> dict:
+    """Sıcak yolu hazırla (startup'ta arka plan görevi olarak çalıştırılır)"""
+    warmup_state.update(status="warming", steps={}, started_at=time.time(), finished_at=None)
+    print("🔥 Isınma başladı...")
+
+    ready = await asyncio.to_thread(_warm_retrieval)
+    # LLM istemcileri event loop üzerinde oluşturulmalı: ChatGoogleGenerativeAI async
+    # istemcisini yalnızca çalışan bir loop varken kurar, yoksa apredict/astream
+    # senkron çağrıya düşer. İstemciler olmadan da istek karşılanabilir; hatası readiness'i düşürmez
+    _run_step("llm_clients", _warm_llm_clients, required=False)
+
+    warmup_state.update(status="ready" if ready else "failed", finished_at=time.time())
+    print(f"🔥 Isınma bitti: {warmup_state['status']} "
+          f"({warmup_state['finished_at'] - warmup_state['started_at']:.1f}s)")
+    return warmup_state
+
+
+def is_ready() -> bool:
+    return warmup_state["status"] == "ready"